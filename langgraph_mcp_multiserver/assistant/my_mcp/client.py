@@ -0,0 +1,109 @@
+"""
+This file connects the assistant to the local MCP servers.
+
+By default the FastMCP servers found in MCP_LOCAL_SERVER_DIR are loaded
+into the client process and each one is connected over a pair of
+in-memory streams instead of stdio. The MCP protocol is the same
+(initialize handshake, list_tools, call_tool), but there is no process to
+start and no pipe to cross, so trivial tools such as `add` answer in
+microseconds and no interpreter per server is needed.
+
+Set MCP_IN_PROCESS=false to connect to the servers of mcp_config.json over
+their configured transports instead (see start_local_mcps.py).
+"""
+
+import contextlib
+import importlib.util
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import load_mcp_tools
+from mcp.server.fastmcp import FastMCP
+from mcp.shared.memory import create_connected_server_and_client_session
+
+
+LOCAL_SERVER_DIR = Path(os.environ.get(
+    "MCP_LOCAL_SERVER_DIR", Path(__file__).parent / "local_servers"))
+IN_PROCESS = os.environ.get("MCP_IN_PROCESS", "true").lower() in ("1", "true")
+CONFIG_FILE = Path(__file__).parent / "mcp_config.json"
+
+
+def load_local_servers(server_dir: Path = LOCAL_SERVER_DIR
+                       ) -> Dict[str, FastMCP]:
+    """
+    Import every server script of `server_dir` and return its FastMCP
+    instances by server name. Scripts without one are skipped.
+    """
+    server_dir = Path(server_dir)
+    # Servers import their sibling modules as they would when run directly
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    servers = {}
+    for path in sorted(server_dir.glob("*.py")):
+        if path.name.startswith("_"):
+            continue
+        spec = importlib.util.spec_from_file_location(
+            f"local_mcp_{path.stem}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        for value in vars(module).values():
+            if isinstance(value, FastMCP):
+                servers[value.name] = value
+    return servers
+
+
+class InProcessMCPClient:
+    """
+    Sessions to FastMCP servers running in this process, connected over
+    in-memory streams. The sessions stay open while the client is used as
+    an async context manager.
+
+    Usage:
+        async with InProcessMCPClient(load_local_servers()) as client:
+            tools = await client.get_tools()
+    """
+
+    def __init__(self, servers: Dict[str, FastMCP]):
+        self.servers = servers
+        self.sessions = {}
+        self._stack = contextlib.AsyncExitStack()
+
+    async def __aenter__(self) -> "InProcessMCPClient":
+        try:
+            for name, server in self.servers.items():
+                self.sessions[name] = await self._stack.enter_async_context(
+                    create_connected_server_and_client_session(
+                        server._mcp_server))
+        except BaseException:
+            await self._stack.aclose()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.sessions = {}
+        await self._stack.aclose()
+
+    async def get_tools(self) -> List[BaseTool]:
+        tools = []
+        for session in self.sessions.values():
+            tools += await load_mcp_tools(session)
+        return tools
+
+
+@contextlib.asynccontextmanager
+async def local_mcp_tools(in_process: bool = IN_PROCESS):
+    """
+    Yield the LangChain tools of the local MCP servers, in-process or over
+    the transports of mcp_config.json.
+    """
+    if in_process:
+        async with InProcessMCPClient(load_local_servers()) as client:
+            yield await client.get_tools()
+    else:
+        with open(CONFIG_FILE, "r") as f:
+            client = MultiServerMCPClient(connections=json.load(f))
+        yield await client.get_tools()
@@ -1,36 +1,242 @@
 """
-Script to start all server instances from local_mcp_servers
+Script to start and supervise all server instances from local_mcp_servers
+
+Every server is started in parallel and counts as ready once it has
+answered the MCP initialize handshake over its stdio. Running servers are
+pinged every HEALTH_INTERVAL seconds; a server that exits or stops
+answering is restarted with exponential backoff. On Ctrl+C (or SIGTERM)
+servers are stopped gracefully: their stdin is closed first, then they are
+terminated and only killed as a last resort.
+
+A report with the startup time, resident memory and restart count of each
+server is printed once all servers are up, every REPORT_INTERVAL seconds
+and on shutdown.
 """
+import asyncio
+import itertools
+import json
 import os
-import subprocess
+import signal
+import sys
 import time
+from pathlib import Path
+from typing import List, Optional
 from dotenv import load_dotenv
+from mcp.types import LATEST_PROTOCOL_VERSION
 
 load_dotenv()
 
 # Path to your server folder
 server_dir = os.environ["MCP_LOCAL_SERVER_DIR"]
 
-# List to hold subprocesses
-processes = []
+READY_TIMEOUT = float(os.environ.get("MCP_READY_TIMEOUT", 30))
+HEALTH_INTERVAL = float(os.environ.get("MCP_HEALTH_INTERVAL", 15))
+PING_TIMEOUT = float(os.environ.get("MCP_PING_TIMEOUT", 10))
+STOP_TIMEOUT = float(os.environ.get("MCP_STOP_TIMEOUT", 5))
+REPORT_INTERVAL = float(os.environ.get("MCP_REPORT_INTERVAL", 300))
+MAX_BACKOFF = 60.0
+
+
+class NotAServer(Exception):
+    """The script exited cleanly without ever answering the handshake."""
+
+
+class ManagedServer:
+    def __init__(self, path: Path):
+        self.path = path
+        self.name = path.stem
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.state = "starting"
+        self.startup_time: Optional[float] = None
+        self.restarts = 0
+        self._ids = itertools.count(1)
+
+    async def _send(self, message: dict):
+        self.proc.stdin.write(json.dumps(message).encode() + b"\n")
+        await self.proc.stdin.drain()
+
+    async def _request(self, method: str, params: Optional[dict] = None,
+                       timeout: float = PING_TIMEOUT) -> dict:
+        request_id = next(self._ids)
+        message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+        if params is not None:
+            message["params"] = params
+        await self._send(message)
+
+        async def response() -> dict:
+            while True:
+                line = await self.proc.stdout.readline()
+                if not line:
+                    raise ConnectionError("server closed its stdout")
+                try:
+                    reply = json.loads(line)
+                except ValueError:
+                    continue  # not a protocol message
+                if reply.get("id") == request_id:
+                    if "error" in reply:
+                        raise ConnectionError(reply["error"])
+                    return reply.get("result", {})
+
+        return await asyncio.wait_for(response(), timeout)
+
+    async def start(self):
+        """Start the process and wait for the initialize handshake."""
+        self.state = "starting"
+        started = time.monotonic()
+        # In a session of its own, so Ctrl+C in the terminal only reaches
+        # the supervisor, which then stops the server in order
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable, str(self.path),
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            limit=16 * 1024 * 1024, start_new_session=True)
+        try:
+            await self._request("initialize", {
+                "protocolVersion": LATEST_PROTOCOL_VERSION,
+                "capabilities": {},
+                "clientInfo": {"name": "start_local_mcps", "version": "1.0"},
+            }, timeout=READY_TIMEOUT)
+            await self._send({"jsonrpc": "2.0",
+                              "method": "notifications/initialized"})
+        except (ConnectionError, OSError, asyncio.TimeoutError):
+            returncode = await self.stop()
+            if returncode == 0:
+                raise NotAServer()
+            raise
+        self.startup_time = time.monotonic() - started
+        self.state = "running"
+
+    async def healthy(self) -> bool:
+        if self.proc.returncode is not None:
+            return False
+        try:
+            await self._request("ping")
+            return True
+        except (ConnectionError, OSError, asyncio.TimeoutError):
+            return False
 
-try:
-    # Start each Python file in the folder
-    for filename in os.listdir(server_dir):
-        if filename.endswith(".py"):
-            filepath = os.path.join(server_dir, filename)
-            print(f"Starting server: {filename}")
-            proc = subprocess.Popen(["python3", filepath])
-            processes.append(proc)
+    async def supervise(self, ready: asyncio.Event):
+        backoff = 1.0
+        while True:
+            try:
+                await self.start()
+            except NotAServer:
+                self.state = "not an MCP server"
+                ready.set()
+                return
+            except (ConnectionError, OSError, asyncio.TimeoutError) as e:
+                self.state = f"failed to start ({e!r})"
+                ready.set()
+                await self._backoff(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+            ready.set()
+            backoff = 1.0
+            while await self.healthy():
+                await asyncio.sleep(HEALTH_INTERVAL)
+            print(f"⚠️  Server {self.name} stopped responding, restarting")
+            await self.stop()
+            await self._backoff(backoff)
 
-    print("\n✅ All servers started. Press Ctrl+C to stop them.\n")
+    async def _backoff(self, delay: float):
+        self.restarts += 1
+        self.state = f"restarting in {delay:g}s"
+        await asyncio.sleep(delay)
 
-    # Keep the script running until interrupted
-    while True:
-        time.sleep(1)
+    async def stop(self) -> Optional[int]:
+        """Close stdin, then terminate, then kill. Returns the exit code."""
+        proc = self.proc
+        if proc is None:
+            return None
+        if proc.returncode is not None:
+            self.state = f"exited with code {proc.returncode}"
+        else:
+            self.state = "stopped"
+            steps = [proc.stdin.close, proc.terminate, proc.kill]
+            for step in steps:
+                try:
+                    step()
+                except (OSError, ProcessLookupError):
+                    pass
+                try:
+                    await asyncio.wait_for(proc.wait(), STOP_TIMEOUT)
+                    break
+                except asyncio.TimeoutError:
+                    continue
+        await proc.wait()
+        return proc.returncode
+
+    def rss(self) -> Optional[int]:
+        """Resident set size in bytes, from /proc (Linux only)."""
+        if self.proc is None or self.proc.returncode is not None:
+            return None
+        try:
+            with open(f"/proc/{self.proc.pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+
+def report(servers: List[ManagedServer]) -> str:
+    lines = [f"{'server':<20} {'pid':>7} {'startup':>9} {'rss':>10} "
+             f"{'restarts':>8}  state"]
+    for server in servers:
+        running = server.proc is not None and server.proc.returncode is None
+        pid = str(server.proc.pid) if running else "-"
+        startup = f"{server.startup_time:.2f}s" \
+            if server.startup_time is not None else "-"
+        rss = server.rss()
+        rss = f"{rss / 1024 ** 2:.1f}MiB" if rss is not None else "-"
+        lines.append(f"{server.name:<20} {pid:>7} {startup:>9} {rss:>10} "
+                     f"{server.restarts:>8}  {server.state}")
+    return "\n".join(lines)
+
+
+async def main():
+    servers = [ManagedServer(path)
+               for path in sorted(Path(server_dir).glob("*.py"))
+               if not path.name.startswith("_")]
+    for server in servers:
+        print(f"Starting server: {server.path.name}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    ready = [asyncio.Event() for _ in servers]
+    tasks = [asyncio.create_task(server.supervise(event))
+             for server, event in zip(servers, ready)]
+
+    async def all_ready():
+        for event in ready:
+            await event.wait()
+
+    waiters = [asyncio.create_task(all_ready()),
+               asyncio.create_task(stop.wait())]
+    await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    for waiter in waiters:
+        waiter.cancel()
+    if not stop.is_set():
+        print("\n✅ All servers started. Press Ctrl+C to stop them.\n")
+        print(report(servers))
+
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), REPORT_INTERVAL)
+        except asyncio.TimeoutError:
+            print("\n" + report(servers))
 
-except KeyboardInterrupt:
     print("\n🛑 Stopping all servers...")
-    for proc in processes:
-        proc.kill()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.gather(*(server.stop() for server in servers))
+    print(report(servers))
     print("✅ All servers stopped. Goodbye!")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
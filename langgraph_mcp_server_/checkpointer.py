@@ -0,0 +1,609 @@
+"""
+This file implements a bounded, persistent checkpointer for the agent graph.
+
+MemorySaver keeps every checkpoint of every thread in memory for the life of
+the process. SQLiteCheckpointer stores them in a SQLite database instead:
+
+- Writes are asynchronous: put() and put_writes() serialize the checkpoint
+  and queue it, and a background thread commits whatever is queued in one
+  transaction per batch. A batch that still fails after a few retries is
+  reported by the next call to the checkpointer, which raises.
+- Only the last CHECKPOINT_KEEP checkpoints of each thread are kept, older
+  ones are deleted together with the values only they referenced.
+- Message lists are compacted: every message is stored once per thread,
+  addressed by the hash of its serialized form, and a checkpoint only
+  stores the list of hashes. A new checkpoint therefore only adds the
+  messages that changed since the previous one.
+- The latest checkpoint of the CHECKPOINT_HOT_THREADS most recently used
+  threads is kept in memory (serialized), so resuming an active
+  conversation does not touch the disk. Colder threads are evicted and
+  read back from SQLite when they are used again.
+"""
+
+import asyncio
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import (Any, AsyncIterator, Dict, Iterator, List, Optional,
+                    Sequence, Tuple)
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (WRITES_IDX_MAP, BaseCheckpointSaver,
+                                       ChannelVersions, Checkpoint,
+                                       CheckpointMetadata, CheckpointTuple,
+                                       get_checkpoint_id,
+                                       get_checkpoint_metadata)
+
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DB_PATH = os.environ.get(
+    "CHECKPOINT_DB_PATH",
+    os.path.join(os.path.dirname(__file__), "checkpoints.db"))
+CHECKPOINT_KEEP = int(os.environ.get("CHECKPOINT_KEEP", 20))
+CHECKPOINT_HOT_THREADS = int(os.environ.get("CHECKPOINT_HOT_THREADS", 64))
+MAX_BATCH_OPS = 256
+WRITE_RETRIES = 3
+
+# Blob type of a message list stored as the JSON list of its message hashes
+MESSAGE_REFS = "message_refs"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    versions TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    thread_id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (thread_id, hash)
+);
+"""
+
+INSERT_CHECKPOINT = "INSERT OR REPLACE INTO checkpoints VALUES " \
+    "(?, ?, ?, ?, ?, ?, ?, ?, ?)"
+INSERT_BLOB = "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)"
+INSERT_MESSAGE = "INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?)"
+
+# Checkpoints of a thread beyond the newest `keep`
+PRUNE_CHECKPOINTS = """
+DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+AND checkpoint_id IN (
+    SELECT checkpoint_id FROM checkpoints
+    WHERE thread_id = ? AND checkpoint_ns = ?
+    ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?)
+"""
+PRUNE_WRITES = """
+DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ?
+AND checkpoint_id NOT IN (
+    SELECT checkpoint_id FROM checkpoints
+    WHERE thread_id = ? AND checkpoint_ns = ?)
+"""
+# Channel values no remaining checkpoint of the thread refers to
+PRUNE_BLOBS = """
+DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?
+AND NOT EXISTS (
+    SELECT 1 FROM checkpoints c, json_each(c.versions) v
+    WHERE c.thread_id = blobs.thread_id
+    AND c.checkpoint_ns = blobs.checkpoint_ns
+    AND v.key = blobs.channel AND v.value = blobs.version)
+"""
+PRUNE_MESSAGES = f"""
+DELETE FROM messages WHERE thread_id = ? AND hash NOT IN (
+    SELECT m.value FROM blobs b, json_each(CAST(b.value AS TEXT)) m
+    WHERE b.thread_id = ? AND b.type = '{MESSAGE_REFS}')
+"""
+
+# A serialized value, as returned by SerializerProtocol.dumps_typed
+Typed = Tuple[str, bytes]
+
+
+def is_message_list(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(
+        isinstance(message, BaseMessage) for message in value)
+
+
+def message_hash(typed: Typed) -> str:
+    digest = hashlib.sha256(typed[0].encode())
+    digest.update(typed[1])
+    return digest.hexdigest()
+
+
+class SavedCheckpoint:
+    """
+    A checkpoint as it is stored: serialized values, message list blobs as
+    hashes plus the messages they refer to, and its pending writes.
+    """
+
+    def __init__(self, checkpoint_id: str, parent_id: Optional[str],
+                 checkpoint: Typed, metadata: Typed,
+                 blobs: Dict[str, Typed], messages: Dict[str, Typed],
+                 writes: Dict[Tuple[str, int], tuple]):
+        self.checkpoint_id = checkpoint_id
+        self.parent_id = parent_id
+        self.checkpoint = checkpoint
+        self.metadata = metadata
+        self.blobs = blobs
+        self.messages = messages
+        self.writes = writes
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver[str]):
+    """
+    A LangGraph checkpointer storing checkpoints in SQLite, written by a
+    background thread. Call close() to flush the queued writes; it is also
+    called at exit.
+
+    Usage:
+        graph = builder.compile(checkpointer=SQLiteCheckpointer())
+    """
+
+    def __init__(self, path: str = CHECKPOINT_DB_PATH,
+                 keep: int = CHECKPOINT_KEEP,
+                 hot_threads: int = CHECKPOINT_HOT_THREADS, *, serde=None):
+        super().__init__(serde=serde)
+        self.path = path
+        self.keep = keep
+        self.hot_threads = hot_threads
+        self._reader = self._connect()
+        self._reader.executescript(SCHEMA)
+        self._read_lock = threading.Lock()
+        # thread_id -> {checkpoint_ns: latest SavedCheckpoint}, LRU order
+        self._hot: "OrderedDict[str, Dict[str, SavedCheckpoint]]" = \
+            OrderedDict()
+        self._hot_lock = threading.RLock()
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop,
+                                        name="checkpoint-writer",
+                                        daemon=True)
+        self._writer.start()
+        self._closed = False
+        self._error: Optional[sqlite3.Error] = None
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # Writes
+
+    def _write_loop(self):
+        conn = self._connect()
+        try:
+            while True:
+                ops = [self._queue.get()]
+                while len(ops) < MAX_BATCH_OPS:
+                    try:
+                        ops.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                batch = [op for op in ops if op is not None]
+                try:
+                    self._apply(conn, batch)
+                except sqlite3.Error as e:
+                    self._fail(e, batch)
+                finally:
+                    for _ in ops:
+                        self._queue.task_done()
+                if None in ops:
+                    return
+        finally:
+            conn.close()
+
+    def _apply(self, conn: sqlite3.Connection, ops: List[tuple]):
+        """Commit a batch of queued statements in one transaction."""
+        if not ops:
+            return
+        touched = {op[0] for op in ops if op[0] is not None}
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                with conn:
+                    for op in ops:
+                        for query, rows in op[1]:
+                            conn.executemany(query, rows)
+                    for thread_id, checkpoint_ns in touched:
+                        self._prune(conn, thread_id, checkpoint_ns)
+                return
+            except sqlite3.OperationalError:
+                # Locked or busy database, the transaction was rolled back
+                if attempt == WRITE_RETRIES:
+                    raise
+                time.sleep(0.1 * 2 ** attempt)
+
+    def _fail(self, error: sqlite3.Error, ops: List[tuple]):
+        """
+        Forget the cached checkpoints, which may not have been saved, and
+        keep the error for the next caller.
+        """
+        logger.error("Could not save %d checkpoint operations: %s",
+                     len(ops), error)
+        with self._hot_lock:
+            self._hot.clear()
+        self._error = error
+
+    def _raise_error(self):
+        error, self._error = self._error, None
+        if error is not None:
+            raise RuntimeError(
+                f"Could not save checkpoints: {error}") from error
+
+    def _prune(self, conn: sqlite3.Connection, thread_id: str,
+               checkpoint_ns: str):
+        deleted = conn.execute(PRUNE_CHECKPOINTS, (
+            thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.keep))
+        if not deleted.rowcount:
+            return
+        key = (thread_id, checkpoint_ns, thread_id, checkpoint_ns)
+        conn.execute(PRUNE_WRITES, key)
+        conn.execute(PRUNE_BLOBS, key[:2])
+        conn.execute(PRUNE_MESSAGES, (thread_id, thread_id))
+
+    def _enqueue(self, key: Optional[Tuple[str, str]], statements: list):
+        if self._closed:
+            raise RuntimeError("The checkpointer is closed")
+        self._raise_error()
+        self._queue.put((key, statements))
+
+    def flush(self):
+        """
+        Wait until every queued write is committed, raising RuntimeError if
+        one could not be.
+        """
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        with self._read_lock:
+            self._reader.close()
+
+    # In-memory cache of the latest checkpoint of the hot threads
+
+    def _cache(self, thread_id: str, checkpoint_ns: str,
+               saved: Optional[SavedCheckpoint]):
+        with self._hot_lock:
+            namespaces = self._hot.setdefault(thread_id, {})
+            self._hot.move_to_end(thread_id)
+            if saved is None:
+                namespaces.pop(checkpoint_ns, None)
+            else:
+                namespaces[checkpoint_ns] = saved
+            while len(self._hot) > self.hot_threads:
+                self._hot.popitem(last=False)
+
+    def _cached(self, thread_id: str, checkpoint_ns: str
+                ) -> Optional[SavedCheckpoint]:
+        with self._hot_lock:
+            if thread_id not in self._hot:
+                return None
+            self._hot.move_to_end(thread_id)
+            return self._hot[thread_id].get(checkpoint_ns)
+
+    # Serialization
+
+    def _dump_value(self, value: Any, messages: Dict[str, Typed]) -> Typed:
+        """Serialize a channel value, message lists as message hashes."""
+        if not is_message_list(value):
+            return self.serde.dumps_typed(value)
+        hashes = []
+        for message in value:
+            typed = self.serde.dumps_typed(message)
+            digest = message_hash(typed)
+            messages[digest] = typed
+            hashes.append(digest)
+        return MESSAGE_REFS, json.dumps(hashes).encode()
+
+    def _load_value(self, typed: Typed, messages: Dict[str, Typed]) -> Any:
+        if typed[0] == MESSAGE_REFS:
+            return [self.serde.loads_typed(messages[digest])
+                    for digest in json.loads(typed[1])]
+        return self.serde.loads_typed(typed)
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str,
+               saved: SavedCheckpoint) -> CheckpointTuple:
+        checkpoint = self.serde.loads_typed(saved.checkpoint)
+        checkpoint["channel_values"] = {
+            channel: self._load_value(typed, saved.messages)
+            for channel, typed in saved.blobs.items()
+            if typed[0] != "empty"}
+        parent_config = None
+        if saved.parent_id:
+            parent_config = {"configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": saved.parent_id}}
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": saved.checkpoint_id}},
+            checkpoint=checkpoint,
+            metadata=self.serde.loads_typed(saved.metadata),
+            parent_config=parent_config,
+            # Sorted by (task_id, idx), as they are read from SQLite
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed(value))
+                for _, (task_id, channel, value, _)
+                in sorted(list(saved.writes.items()))])
+
+    # Reads from SQLite
+
+    def _load(self, thread_id: str, checkpoint_ns: str, row: tuple
+              ) -> SavedCheckpoint:
+        checkpoint_id, parent_id, type_, checkpoint, metadata_type, \
+            metadata, versions = row
+        conn = self._reader
+        blobs = {}
+        for channel, version in json.loads(versions).items():
+            blob = conn.execute(
+                "SELECT type, value FROM blobs WHERE thread_id = ? AND "
+                "checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, version)).fetchone()
+            if blob is not None:
+                blobs[channel] = (blob[0], blob[1])
+        refs = [digest for typed in blobs.values()
+                if typed[0] == MESSAGE_REFS
+                for digest in json.loads(typed[1])]
+        messages = {
+            digest: (type_name, value)
+            for digest, type_name, value in conn.execute(
+                "SELECT hash, type, value FROM messages WHERE thread_id = ? "
+                "AND hash IN (SELECT value FROM json_each(?))",
+                (thread_id, json.dumps(refs)))}
+        writes = {
+            (task_id, idx): (task_id, channel, (value_type, value),
+                             task_path)
+            for task_id, idx, channel, value_type, value, task_path
+            in conn.execute(
+                "SELECT task_id, idx, channel, type, value, task_path "
+                "FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND "
+                "checkpoint_id = ? ORDER BY task_id, idx",
+                (thread_id, checkpoint_ns, checkpoint_id))}
+        return SavedCheckpoint(checkpoint_id, parent_id, (type_, checkpoint),
+                               (metadata_type, metadata), blobs, messages,
+                               writes)
+
+    def _select(self, where: str, params: tuple, limit: Optional[int] = None
+                ) -> List[Tuple[str, str, SavedCheckpoint]]:
+        self.flush()
+        query = "SELECT thread_id, checkpoint_ns, checkpoint_id, " \
+            "parent_id, type, checkpoint, metadata_type, metadata, " \
+            f"versions FROM checkpoints {where} ORDER BY checkpoint_id DESC"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        with self._read_lock:
+            return [(row[0], row[1], self._load(row[0], row[1], row[2:]))
+                    for row in self._reader.execute(query, params).fetchall()]
+
+    # BaseCheckpointSaver
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        saved = self._cached(thread_id, checkpoint_ns)
+        if saved is None or checkpoint_id not in (None, saved.checkpoint_id):
+            where = "WHERE thread_id = ? AND checkpoint_ns = ?"
+            params = (thread_id, checkpoint_ns)
+            if checkpoint_id:
+                where += " AND checkpoint_id = ?"
+                params += (checkpoint_id,)
+            found = self._select(where, params, limit=1)
+            if not found:
+                return None
+            saved = found[0][2]
+            if checkpoint_id is None:
+                self._cache(thread_id, checkpoint_ns, saved)
+        return self._tuple(thread_id, checkpoint_ns, saved)
+
+    def list(self, config: Optional[RunnableConfig], *,
+             filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None,
+             limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        conditions, params = [], ()
+        if config:
+            conditions.append("thread_id = ?")
+            params += (config["configurable"]["thread_id"],)
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                conditions.append("checkpoint_ns = ?")
+                params += (checkpoint_ns,)
+            if checkpoint_id := get_checkpoint_id(config):
+                conditions.append("checkpoint_id = ?")
+                params += (checkpoint_id,)
+        if before and (before_id := get_checkpoint_id(before)):
+            conditions.append("checkpoint_id < ?")
+            params += (before_id,)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        # Metadata is filtered after loading, so the limit is applied here
+        rows = self._select(where, params, None if filter else limit)
+        for thread_id, checkpoint_ns, saved in rows:
+            if limit is not None and limit <= 0:
+                return
+            checkpoint = self._tuple(thread_id, checkpoint_ns, saved)
+            if filter and not all(
+                    checkpoint.metadata.get(key) == value
+                    for key, value in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield checkpoint
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint,
+            metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+        c = checkpoint.copy()
+        values = c.pop("channel_values")
+        messages: Dict[str, Typed] = {}
+        new_blobs = {
+            channel: self._dump_value(values[channel], messages)
+            if channel in values else ("empty", b"")
+            for channel in new_versions}
+        saved = SavedCheckpoint(
+            checkpoint["id"], parent_id, self.serde.dumps_typed(c),
+            self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+            {}, messages, {})
+
+        # The cache holds the values of every channel of the latest
+        # checkpoint; carry over the unchanged ones from its parent
+        previous = self._cached(thread_id, checkpoint_ns)
+        versions = checkpoint["channel_versions"]
+        complete = True
+        for channel in versions:
+            if channel in new_blobs:
+                saved.blobs[channel] = new_blobs[channel]
+            elif previous is not None and \
+                    previous.checkpoint_id == parent_id and \
+                    channel in previous.blobs:
+                typed = saved.blobs[channel] = previous.blobs[channel]
+                if typed[0] == MESSAGE_REFS:
+                    for digest in json.loads(typed[1]):
+                        messages[digest] = previous.messages[digest]
+            else:
+                complete = False
+
+        with self._hot_lock:
+            # Cache and queue in the same order as the writes are applied
+            self._cache(thread_id, checkpoint_ns, saved if complete else None)
+            self._enqueue((thread_id, checkpoint_ns), [
+                (INSERT_MESSAGE, [(thread_id, digest) + typed
+                                  for digest, typed in messages.items()]),
+                (INSERT_BLOB, [(thread_id, checkpoint_ns, channel,
+                                str(new_versions[channel])) + typed
+                               for channel, typed in new_blobs.items()]),
+                (INSERT_CHECKPOINT, [(
+                    thread_id, checkpoint_ns, saved.checkpoint_id,
+                    parent_id, *saved.checkpoint, *saved.metadata,
+                    json.dumps({channel: str(version)
+                                for channel, version in versions.items()})
+                )])])
+        return {"configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig,
+                   writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Special writes (errors, interrupts...) replace earlier ones
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            rows.append((task_id, idx, channel, self.serde.dumps_typed(value),
+                         task_path))
+        with self._hot_lock:
+            saved = self._cached(thread_id, checkpoint_ns)
+            if saved is not None and saved.checkpoint_id == checkpoint_id:
+                for task_id_, idx, channel, typed, path in rows:
+                    if replace or (task_id_, idx) not in saved.writes:
+                        saved.writes[(task_id_, idx)] = (task_id_, channel,
+                                                         typed, path)
+            self._enqueue(None, [(
+                f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO "
+                "writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(thread_id, checkpoint_ns, checkpoint_id, task_id_, idx,
+                  channel, *typed, path)
+                 for task_id_, idx, channel, typed, path in rows])])
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._hot_lock:
+            self._hot.pop(thread_id, None)
+            self._enqueue(None, [
+                (f"DELETE FROM {table} WHERE thread_id = ?", [(thread_id,)])
+                for table in ("checkpoints", "blobs", "writes", "messages")])
+
+    async def aget_tuple(self, config: RunnableConfig
+                         ) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        saved = self._cached(thread_id, checkpoint_ns)
+        if saved is not None and get_checkpoint_id(config) in (
+                None, saved.checkpoint_id):
+            return self._tuple(thread_id, checkpoint_ns, saved)
+        # Waiting for the writer and reading the disk would block the loop
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *,
+                    filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None
+                    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoints = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before,
+                                   limit=limit)))
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint,
+                   metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig,
+                          writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
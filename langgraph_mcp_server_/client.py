@@ -7,13 +7,18 @@ them in the same way by specifying the MCP server configuration in
 mcp_config.json
 """
 
+import asyncio
+import os
 from typing import AsyncGenerator
 from langchain_core.messages import HumanMessage, AIMessageChunk
-from langchain_mcp_adapters.client import MultiServerMCPClient
 from langgraph.graph import StateGraph
 from my_mcp.config import mcp_config
+from my_mcp.session_pool import SessionPool
 from graph import build_agent_graph, AgentState
 
+# Supersteps per user turn, two per tool round
+GRAPH_RECURSION_LIMIT = int(os.environ.get("GRAPH_RECURSION_LIMIT", 50))
+
 
 async def stream_graph_response(
         input: AgentState, graph: StateGraph, config: dict = {}
@@ -64,36 +69,36 @@ async def main():
     """
     Initialize the MCP Client and run the agent conversation loop.
 
-    The MultiServerMCPClient allows the connection to multiple MCP servers
-    using a single client and config.
+    The SessionPool connects to multiple MCP servers using a single config
+    and keeps one session per server open for the whole conversation.
     """
-    client = MultiServerMCPClient(connections=mcp_config)
-    tools = await client.get_tools()
-    graph = build_agent_graph(tools=tools)
-
-    graph_config = {
-        "configurable": {
-            "thread_id": "1"
+    async with SessionPool(mcp_config) as pool:
+        tools = await pool.get_tools()
+        graph = build_agent_graph(tools=tools)
+
+        graph_config = {
+            "configurable": {
+                "thread_id": "1"
+            },
+            "recursion_limit": GRAPH_RECURSION_LIMIT
         }
-    }
 
-    while True:
-        user_input = input("\n\n USER: ")
-        if user_input in ["quit", "exit"]:
-            break
+        while True:
+            # Read input off the event loop so health checks keep running
+            user_input = await asyncio.to_thread(input, "\n\n USER: ")
+            if user_input in ["quit", "exit"]:
+                break
 
-        print("\n ------ USER ------ \n\n", user_input)
-        print("\n ------ ASSISTANT ------ \n\n")
+            print("\n ------ USER ------ \n\n", user_input)
+            print("\n ------ ASSISTANT ------ \n\n")
 
-        async for response in stream_graph_response(
-            input=AgentState(messages=[HumanMessage(content=user_input)]),
-            graph=graph,
-            config=graph_config
-        ):
-            print(response, end="", flush=True)
+            async for response in stream_graph_response(
+                input=AgentState(messages=[HumanMessage(content=user_input)]),
+                graph=graph,
+                config=graph_config
+            ):
+                print(response, end="", flush=True)
 
 
 if __name__ == "__main__":
-    import asyncio
-
     asyncio.run(main())
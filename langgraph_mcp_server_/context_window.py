@@ -0,0 +1,211 @@
+"""
+This file keeps the prompt sent to the LLM under a token budget.
+
+The conversation history in the graph state is never modified. Instead,
+every turn the model sees:
+
+    1. The system prompt, followed by a summary of the older part of the
+       conversation (cached in the state as `summary`).
+    2. The latest user message, if it is already summarized.
+    3. The messages after the last summarized one, where the outputs of
+       every tool round but the latest one are cut to
+       CONTEXT_TOOL_OUTPUT_CHARS characters.
+
+When that window is larger than CONTEXT_TOKEN_BUDGET, the ContextManager
+folds the oldest messages into the summary until the recent messages take
+at most CONTEXT_KEEP_TOKENS tokens. Only the messages that are new to the
+summary are sent to the summarizer, together with the previous summary,
+so the cost of a summary does not grow with the session length.
+
+An AI message with tool calls and the tool messages answering it are
+always kept or summarized together. Older turns are summarized from one
+user message to the next, but the tool rounds of the current turn can be
+summarized one by one, so a single request running many tool calls does
+not outgrow the budget. The latest user message and the latest tool
+results are always sent verbatim.
+"""
+
+import os
+from typing import List
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (AIMessage, BaseMessage, HumanMessage,
+                                     SystemMessage, ToolMessage)
+from langchain_core.messages.utils import count_tokens_approximately
+
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 32000))
+CONTEXT_KEEP_TOKENS = int(os.environ.get("CONTEXT_KEEP_TOKENS",
+                                         CONTEXT_TOKEN_BUDGET // 2))
+CONTEXT_TOOL_OUTPUT_CHARS = int(os.environ.get("CONTEXT_TOOL_OUTPUT_CHARS",
+                                               2000))
+
+SUMMARY_PROMPT = """
+You maintain the running summary of a conversation between a user and Pepe,
+a data science assistant using tools. Extend the summary with the new
+messages below. Keep every fact Pepe needs to continue the work: the user's
+goals and decisions, the projects, files and datasets involved, the data
+loaded into the session, the results of tool calls and any open questions.
+Drop small talk and raw tool output that is no longer needed. Answer with
+the updated summary only.
+
+<summary>
+{summary}
+</summary>
+
+<new_messages>
+{messages}
+</new_messages>
+"""
+
+
+def group_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """
+    Split messages into units that must stay together: an AI message with
+    tool calls and the tool messages that answer it form one unit.
+    """
+    units: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, ToolMessage) and units and \
+                isinstance(units[-1][0], AIMessage) and \
+                units[-1][0].tool_calls:
+            units[-1].append(message)
+        else:
+            units.append([message])
+    return units
+
+
+def trim_tool_output(message: BaseMessage,
+                     max_chars: int = CONTEXT_TOOL_OUTPUT_CHARS
+                     ) -> BaseMessage:
+    """Cut the content of a tool message, leaving other messages as is."""
+    if not isinstance(message, ToolMessage):
+        return message
+    content = message.content if isinstance(message.content, str) \
+        else str(message.content)
+    if len(content) <= max_chars:
+        return message
+    return message.model_copy(update={"content": (
+        f"{content[:max_chars]}\n[... {len(content) - max_chars} more "
+        "characters of tool output left out]")})
+
+
+def render(messages: List[BaseMessage],
+           max_chars: int = CONTEXT_TOOL_OUTPUT_CHARS) -> str:
+    """Plain text transcript of the messages, for the summarizer."""
+    lines = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            lines.append(f"USER: {message.content}")
+        elif isinstance(message, ToolMessage):
+            lines.append(f"TOOL RESULT ({message.name}): "
+                         f"{trim_tool_output(message, max_chars).content}")
+        elif isinstance(message, AIMessage):
+            if message.content:
+                lines.append(f"PEPE: {message.content}")
+            for call in message.tool_calls:
+                lines.append(f"TOOL CALL: {call['name']}({call['args']})")
+    return "\n".join(lines)
+
+
+class ContextManager:
+    """
+    Updates the cached conversation summary (calling it with the state
+    returns the state update) and builds the messages sent to the LLM.
+
+    The state must have the fields `messages`, `summary` (str) and
+    `summarized_until` (id of the last summarized message, or None).
+    """
+
+    def __init__(self, summarizer: BaseChatModel, system_prompt: str,
+                 budget: int = CONTEXT_TOKEN_BUDGET,
+                 keep_tokens: int = CONTEXT_KEEP_TOKENS,
+                 tool_output_chars: int = CONTEXT_TOOL_OUTPUT_CHARS):
+        self.summarizer = summarizer
+        self.system_prompt = system_prompt
+        self.budget = budget
+        self.keep_tokens = min(keep_tokens, budget)
+        self.tool_output_chars = tool_output_chars
+
+    @staticmethod
+    def pending(state) -> List[BaseMessage]:
+        """The messages not covered by the summary."""
+        messages = state.messages
+        if state.summarized_until is not None:
+            for i, message in enumerate(messages):
+                if message.id == state.summarized_until:
+                    return messages[i + 1:]
+        return messages
+
+    @staticmethod
+    def carried(state, pending: List[BaseMessage]) -> List[BaseMessage]:
+        """
+        The latest user message when it is already summarized (together
+        with some tool rounds answering it), so it stays in the window.
+        """
+        first_pending = len(state.messages) - len(pending)
+        last_human = max((i for i, message in enumerate(state.messages)
+                          if isinstance(message, HumanMessage)), default=None)
+        if last_human is None or last_human >= first_pending:
+            return []
+        return [state.messages[last_human]]
+
+    def _trimmed(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """Cut the tool outputs of every tool round before the latest."""
+        last_round = max((i for i, message in enumerate(messages)
+                          if isinstance(message, AIMessage) and
+                          message.tool_calls), default=len(messages))
+        return [trim_tool_output(message, self.tool_output_chars)
+                if i < last_round else message
+                for i, message in enumerate(messages)]
+
+    def system_message(self, summary: str) -> SystemMessage:
+        system_prompt = self.system_prompt
+        if summary:
+            system_prompt += ("\n<conversation_summary>\n"
+                              f"{summary}\n</conversation_summary>\n")
+        return SystemMessage(content=system_prompt)
+
+    def window(self, state) -> List[BaseMessage]:
+        """The messages to send to the LLM for the current state."""
+        pending = self.pending(state)
+        return [self.system_message(state.summary)] + \
+            self.carried(state, pending) + self._trimmed(pending)
+
+    def _split(self, units: List[List[BaseMessage]]) -> int:
+        """
+        Index of the first unit to keep, so that the kept units fit in
+        keep_tokens. The latest unit is always kept. Before the latest user
+        message the window starts at a user message; after it, at any
+        unit.
+        """
+        start = len(units) - 1
+        tokens = count_tokens_approximately(units[start])
+        while start > 0:
+            tokens += count_tokens_approximately(units[start - 1])
+            if tokens > self.keep_tokens:
+                break
+            start -= 1
+        for i in range(start, len(units)):
+            if isinstance(units[i][0], HumanMessage):
+                return i
+        return start
+
+    def summarize(self, summary: str, messages: List[BaseMessage]) -> str:
+        response = self.summarizer.invoke(SUMMARY_PROMPT.format(
+            summary=summary or "(empty)",
+            messages=render(messages, self.tool_output_chars)))
+        return response.text()
+
+    def __call__(self, state) -> dict:
+        window = self.window(state)
+        if count_tokens_approximately(window) <= self.budget:
+            return {}
+        units = group_turns(self._trimmed(self.pending(state)))
+        if len(units) < 2:
+            return {}
+        start = self._split(units)
+        if start == 0:
+            return {}
+        old = [message for unit in units[:start] for message in unit]
+        return {"summary": self.summarize(state.summary, old),
+                "summarized_until": old[-1].id}
@@ -1,17 +1,22 @@
 import os
 
-from typing import List, Annotated
+from typing import List, Annotated, Optional
 from pydantic import BaseModel
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage
 from langchain.tools import tool, BaseTool
+from langgraph.constants import TAG_NOSTREAM
 from langgraph.graph import StateGraph, add_messages, START
-from langgraph.prebuilt import ToolNode, tools_condition
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.prebuilt import tools_condition
+from checkpointer import SQLiteCheckpointer
+from context_window import ContextManager
+from tool_executor import ToolExecutor
 
 
 class AgentState(BaseModel):
     messages: Annotated[List, add_messages]
+    # Summary of the messages up to summarized_until (see context_window)
+    summary: str = ""
+    summarized_until: Optional[str] = None
 
 
 @tool
@@ -95,16 +100,29 @@ Assist the customer in all aspects of their data science workflow.
             working_dir=os.environ.get('MCP_FILESYSTEM_DIR')
         )
 
-    def assistant(state: AgentState) -> AgentState:
-        response = llm.invoke([SystemMessage(content=system_prompt) +
-                               state.messages])
-        state.messages.append(response)
-        return state
+    # Summaries are not streamed to the user
+    summarizer = ChatGoogleGenerativeAI(
+            model=os.environ.get("CONTEXT_SUMMARY_MODEL", "gemini-2.5-flash"),
+            temperature=0,
+            max_tokens=2048,
+            timeout=None,
+            max_retries=2
+        ).with_config(tags=[TAG_NOSTREAM])
+    context = ContextManager(summarizer, system_prompt)
+
+    def assistant(state: AgentState) -> dict:
+        # Windowing runs here instead of in a node of its own, so a tool
+        # round costs two supersteps of the recursion limit, not three
+        update = context(state)
+        if update:
+            state = state.model_copy(update=update)
+        response = llm.invoke(context.window(state))
+        return {"messages": [response], **update}
 
     builder = StateGraph(AgentState)
 
     builder.add_node("Pepe", assistant)
-    builder.add_node(ToolNode(tools))
+    builder.add_node("tools", ToolExecutor(tools))
 
     builder.add_edge(START, "Pepe")
     builder.add_conditional_edges(
@@ -113,7 +131,7 @@ Assist the customer in all aspects of their data science workflow.
     )
     builder.add_edge("tools", "Pepe")
 
-    return builder.compile(checkpointer=MemorySaver())
+    return builder.compile(checkpointer=SQLiteCheckpointer())
 
 
 if __name__ == "__main__":
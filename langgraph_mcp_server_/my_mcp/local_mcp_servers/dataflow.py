@@ -1,39 +1,639 @@
+import asyncio
+import atexit
+import contextlib
+import glob
 import os
+import re
+import secrets
+import shutil
 import subprocess
-from typing import Optional
-import pandas as pd
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import (AsyncIterator, Awaitable, Callable, Dict, List,
+                    Optional)
 import duckdb
 from dotenv import load_dotenv
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
+from dataflow_cache import (ColumnarCache, ResultCache, is_cacheable,
+                            is_row_query, normalize_sql, split_statements)
+from dataflow_engine import (PRESSURE_RATIO, AbortStats, EngineSettings,
+                             EngineStatus, engine_status, executor,
+                             format_bytes, parse_bytes, quote_identifier,
+                             quote_literal, run_interruptible,
+                             status_executor)
+from dataflow_profile import build_profile, render_profile
+from dataflow_results import RESULT_FORMATS, QueryCursor, page_footer
 
 
 load_dotenv()
 mcp = FastMCP("dataflow")
 
+DATASET_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+FORMAT_EXTENSIONS = {
+    ".csv": "csv", ".tsv": "csv", ".txt": "csv",
+    ".parquet": "parquet", ".pq": "parquet",
+    ".json": "json", ".jsonl": "json", ".ndjson": "json",
+}
+FORMAT_READERS = {
+    "csv": "read_csv_auto",
+    "parquet": "read_parquet",
+    "json": "read_json_auto",
+}
+COMPRESSION_EXTENSIONS = (".gz", ".zst")
+# Statements whose effect only lives on the connection that ran them
+SESSION_STATEMENT = re.compile(
+    r"^\s*(prepare|execute|deallocate|set|reset|use|attach|detach|begin|"
+    r"start|commit|rollback|abort|"
+    r"create\s+(or\s+replace\s+)?temp(orary)?)\b", re.IGNORECASE)
+
+PAGE_ROWS = int(os.environ.get("DATAFLOW_PAGE_ROWS", 50))
+MAX_RESULT_CHARS = int(os.environ.get("DATAFLOW_MAX_RESULT_CHARS", 20_000))
+MAX_CURSORS = int(os.environ.get("DATAFLOW_MAX_CURSORS", 16))
+CURSOR_TTL = float(os.environ.get("DATAFLOW_CURSOR_TTL", 600))
+RESULT_CACHE_BYTES = int(os.environ.get("DATAFLOW_RESULT_CACHE_BYTES",
+                                        32 * 1024 * 1024))
+DISK_CACHE_BYTES = int(os.environ.get("DATAFLOW_DISK_CACHE_BYTES",
+                                      10 * 1024 ** 3))
+DISK_CACHE_MAX_AGE = float(os.environ.get("DATAFLOW_DISK_CACHE_MAX_AGE_DAYS",
+                                          30)) * 86400
+QUERY_TIMEOUT = float(os.environ.get("DATAFLOW_QUERY_TIMEOUT", 60))
+MAX_QUERY_TIMEOUT = float(os.environ.get("DATAFLOW_MAX_QUERY_TIMEOUT", 300))
+MAX_RESULT_ROWS = int(os.environ.get("DATAFLOW_MAX_RESULT_ROWS", 100_000))
+LOAD_TIMEOUT = float(os.environ.get("DATAFLOW_LOAD_TIMEOUT", 600))
+STATUS_TIMEOUT = 5.0
+MAX_SESSIONS = int(os.environ.get("DATAFLOW_MAX_SESSIONS", 32))
+SESSION_IDLE_TIMEOUT = float(os.environ.get("DATAFLOW_SESSION_IDLE_TIMEOUT",
+                                            1800))
+TOTAL_MEMORY = parse_bytes(os.environ.get("DATAFLOW_TOTAL_MEMORY", ""))
+SERVER_BUSY = "the dataflow server is busy, try again later."
+ROW_BUDGET_NOTE = (f" Stopped at the budget of {MAX_RESULT_ROWS} rows per "
+                   "query: aggregate or filter in SQL to see the rest.")
+
+
+class ServerAtCapacity(Exception):
+    """No session can be opened for a new client right now."""
+
+
+def sniff_format(file_path: str) -> str:
+    """
+    Guess the file format from its extension, falling back to the first
+    bytes of the file (Parquet magic number or a JSON opening bracket).
+    """
+    root, ext = os.path.splitext(file_path.lower())
+    if ext in COMPRESSION_EXTENSIONS:
+        ext = os.path.splitext(root)[1]
+    if ext in FORMAT_EXTENSIONS:
+        return FORMAT_EXTENSIONS[ext]
+    if not os.path.isfile(file_path):
+        return "csv"
+    with open(file_path, "rb") as f:
+        head = f.read(64)
+    if head.startswith(b"PAR1"):
+        return "parquet"
+    if head.lstrip()[:1] in (b"{", b"["):
+        return "json"
+    return "csv"
+
+
+@dataclass
+class Dataset:
+    name: str
+    path: str
+    fmt: str
+    mode: str
+    cached_path: Optional[str] = None
+    profile: Optional[dict] = None
+
+    @property
+    def kind(self) -> str:
+        return "VIEW" if self.mode == "view" else "TABLE"
+
+    def fingerprint(self) -> tuple:
+        """Path, modification time and size of every file backing it."""
+        if any(c in self.path for c in "*?["):
+            files = sorted(glob.glob(self.path))
+        else:
+            files = [self.path]
+        stats = []
+        for file in files:
+            try:
+                stat = os.stat(file)
+                stats.append((file, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stats.append((file, None, None))
+        return (self.name, self.mode, tuple(stats))
+
+    def size(self) -> int:
+        """Total size in bytes of the files backing the dataset."""
+        return sum(stat[2] or 0 for stat in self.fingerprint()[2])
+
 
 class DataFlowSession:
-    def __init__(self):
-        self.data: Optional[pd.DataFrame] = None
+    """
+    Holds the datasets loaded by the agent together with a single long-lived
+    DuckDB connection. The connection is opened on first use and every
+    dataset is registered once in its catalog under its own name, so queries
+    are reused instead of rebuilt on every call.
+
+    Prepared statements, TEMP objects and SET options only live on the
+    connection that created them. Queries that use them (PREPARE, EXECUTE,
+    DEALLOCATE, CREATE TEMP, SET, transactions...) run on the long-lived
+    connection itself, one at a time, and once a session has run one all
+    its queries do, so later calls see that state. Their results are not
+    kept open for dataflow_fetch_rows; further rows are read with offset.
+
+    Datasets are loaded as lazy views over DuckDB's native CSV, Parquet and
+    JSON scanners by default: nothing is read until a query runs, and only
+    the columns the query touches are decoded. Mode 'table' materializes the
+    file into DuckDB's own columnar storage instead.
+
+    CSV and JSON files are converted to Parquet on their first load and kept
+    in a ColumnarCache (shared by all sessions) under MCP_FILESYS_DIR, later
+    loads of the unchanged file (same path, size and mtime) scan the Parquet
+    copy instead of parsing the text again.
+
+    The connection is configured from the environment (EngineSettings) with
+    a memory limit and a spill directory so that loads, joins and sorts
+    larger than memory run out-of-core. Every response ends with the engine
+    memory and spill usage, and the session throttles itself when memory
+    runs short: table loads that would not fit fall back to views and open
+    cursors are released.
+
+    Complete query results are kept in a ResultCache keyed by the normalized
+    SQL and the fingerprint of the loaded files. Statements that may change
+    the database (anything but a single SELECT statement) bump
+    `generation`, which is part of the key as well.
+
+    Loading also profiles the dataset (schema, row count and per column
+    statistics) in one aggregate pass, so the agent learns the shape of the
+    data without extra queries. Profiles are kept with the dataset and, for
+    cached files, on disk next to the Parquet copy. Views that are not
+    backed by a cached copy are only profiled on request, so loading them
+    does not scan the file. Profiling is best effort: a dataset whose
+    columns cannot be profiled (e.g. nested types) is loaded without one.
+
+    DuckDB work never runs on the event loop: each call gets its own cursor
+    on the session database (or the session connection, see above) and
+    runs on the worker pool with a timeout, after which (or on
+    cancellation) the cursor is interrupted. The
+    catalog, cursors and caches are only modified from the event loop.
+
+    Queries run within budgets: the timeout (at most MAX_QUERY_TIMEOUT,
+    whatever the caller asks for), MAX_RESULT_ROWS rows over all pages of
+    a result and the engine memory limit. Aborts are counted in `aborts`.
+    """
+
+    def __init__(self, engine: Optional[EngineSettings] = None,
+                 disk_cache: Optional[ColumnarCache] = None):
+        self.datasets: Dict[str, Dataset] = {}
         self.working_dir = os.environ.get("MCP_FILESYS_DIR", None)
+        self.con: Optional[duckdb.DuckDBPyConnection] = None
+        self.engine = engine or EngineSettings.from_env(self.working_dir)
+        self.cursors: OrderedDict[str, QueryCursor] = OrderedDict()
+        self.result_cache = ResultCache(RESULT_CACHE_BYTES)
+        self.generation = 0
+        # Set once a query left state on the session connection
+        self.stateful = False
+        self.disk_cache = disk_cache
+        self.last_used = time.monotonic()
+        self.active_calls = 0
+        self.aborts = AbortStats()
+        self._lock = threading.Lock()
+        self._session_lock = asyncio.Lock()
+
+    def _connection(self) -> duckdb.DuckDBPyConnection:
+        if self.con is None:
+            self.con = duckdb.connect(database=':memory:')
+            self.engine.apply(self.con)
+        return self.con
+
+    def _cursor(self) -> duckdb.DuckDBPyConnection:
+        """A new connection to the session database for one worker call."""
+        with self._lock:
+            return self._connection().cursor()
+
+    @contextlib.asynccontextmanager
+    async def _query_connection(self, session: bool
+                                ) -> AsyncIterator[duckdb.DuckDBPyConnection]:
+        """
+        A fresh cursor owned by the caller, or with `session` the session
+        connection itself, held by one call at a time so an interrupt only
+        ever stops the caller's own statement.
+        """
+        if not session:
+            yield self._cursor()
+            return
+        async with self._session_lock:
+            with self._lock:
+                con = self._connection()
+            yield con
+
+    def _uses_session(self, query: str) -> bool:
+        """Whether `query` must run on the session connection."""
+        if not self.stateful:
+            self.stateful = any(SESSION_STATEMENT.match(statement)
+                                for statement in split_statements(query))
+        return self.stateful
+
+    async def _run(self, timeout: float, fn: Callable, *args,
+                   pool=executor, session: bool = False):
+        """
+        Run `fn(con, *args)` on the worker pool with a fresh cursor `con`,
+        which is closed by the worker once `fn` returns, or with `session`
+        on the session connection.
+        """
+        async with self._query_connection(session) as con:
+            def work():
+                try:
+                    return fn(con, *args)
+                finally:
+                    if not session:
+                        con.close()
+
+            return await run_interruptible(con, timeout, work, pool=pool)
 
-    async def load_data(self, file_path: str) -> str:
+    async def _status(self) -> EngineStatus:
+        """Engine usage, probed outside the query worker pool."""
+        return await self._run(STATUS_TIMEOUT, engine_status,
+                               pool=status_executor)
+
+    async def _engine_report(self, response: str, notes: List[str]) -> str:
+        """Append throttling notes and the engine usage to a response."""
+        try:
+            status = await self._status()
+        except (duckdb.Error, TimeoutError):
+            return "\n".join([response] + notes)
+        return "\n".join([response] + notes + [status.summary()])
+
+    async def _relieve_memory_pressure(self) -> List[str]:
+        """
+        Close the open cursors when engine memory runs short. Raises
+        TimeoutError when the engine does not answer the status probe.
+        """
+        try:
+            status = await self._status()
+        except duckdb.Error:
+            return []
+        if not status.under_pressure:
+            return []
+        note = ("[throttle] engine memory is above "
+                f"{int(PRESSURE_RATIO * 100)}% of the limit")
+        if self.cursors:
+            note += f", closed {len(self.cursors)} open cursors"
+            self._close_cursors()
+        return [note + ". Prefer aggregations over raw rows."]
+
+    def _close_cursors(self, expired_only: bool = False):
+        now = time.monotonic()
+        for cursor_id, cursor in list(self.cursors.items()):
+            if expired_only and now - cursor.last_used < CURSOR_TTL and \
+                    len(self.cursors) <= MAX_CURSORS:
+                continue
+            self.cursors.pop(cursor_id).close()
+
+    def _row_budget_reached(self, cursor: QueryCursor) -> bool:
+        """Close a cursor that returned MAX_RESULT_ROWS rows."""
+        if cursor.exhausted or cursor.position < MAX_RESULT_ROWS:
+            return False
+        cursor.close()
+        self.aborts.rows += 1
+        return True
+
+    def _fingerprint(self) -> tuple:
+        return (self.generation,) + tuple(
+            dataset.fingerprint() for dataset in self.datasets.values())
+
+    def _profile_dataset(self, con: duckdb.DuckDBPyConnection,
+                         dataset: Dataset, columns: List[tuple],
+                         relation: Optional[str] = None):
+        """
+        Worker: set the profile of `dataset`, reusing a cached one.
+        `relation` is the view or table to read, by default the dataset's.
+        """
+        if dataset.cached_path:
+            dataset.profile = self.disk_cache.load_profile(
+                dataset.cached_path)
+        if dataset.profile is None:
+            dataset.profile = build_profile(
+                con, relation or dataset.name,
+                [(c[0], c[1]) for c in columns])
+            if dataset.cached_path:
+                self.disk_cache.save_profile(dataset.cached_path,
+                                             dataset.profile)
+
+    def _create_dataset(self, con: duckdb.DuckDBPyConnection,
+                        dataset: Dataset, previous: Optional[Dataset],
+                        profile: bool):
+        """
+        Worker: replace `previous` by the view or table of `dataset`.
+
+        The new one is created and profiled under a temporary name and only
+        then swapped in, so `previous` stays queryable during the load and
+        is kept if the load fails.
+        """
+        notes = []
+        name = quote_identifier(dataset.name)
+        # Dataset names cannot contain dots, so this never clashes
+        loading = f"{dataset.name}.loading"
+        tmp = quote_identifier(loading)
+        headroom = engine_status(con).headroom()
+        if dataset.mode == "table" and headroom is not None and \
+                dataset.size() > headroom:
+            dataset.mode = "view"
+            notes.append(
+                f"[throttle] {format_bytes(dataset.size())} does not fit "
+                f"in the {format_bytes(headroom)} of free engine memory, "
+                "loaded as a view instead of a table.")
+
+        scan = (f"{FORMAT_READERS[dataset.fmt]}"
+                f"({quote_literal(dataset.path)})")
+        try:
+            if self.disk_cache is not None and dataset.fmt != "parquet" \
+                    and os.path.isfile(dataset.path):
+                dataset.cached_path = self.disk_cache.columnar_copy(
+                    con, dataset.path, scan)
+                scan = f"read_parquet({quote_literal(dataset.cached_path)})"
+            con.execute(f"CREATE OR REPLACE {dataset.kind} {tmp} "
+                        f"AS SELECT * FROM {scan}")
+            columns = con.execute(f"DESCRIBE {tmp}").fetchall()
+            if profile and dataset.mode == "view" and \
+                    not dataset.cached_path:
+                notes.append("Call dataflow_profile for the profile of "
+                             "this view.")
+            elif profile:
+                try:
+                    self._profile_dataset(con, dataset, columns, loading)
+                except duckdb.InterruptException:
+                    raise
+                except duckdb.Error as e:
+                    dataset.profile = None
+                    notes.append("No profile: "
+                                 f"{str(e).splitlines()[0]}")
+
+            con.execute("BEGIN TRANSACTION")
+            try:
+                if previous is not None:
+                    con.execute(f"DROP {previous.kind} IF EXISTS {name}")
+                con.execute(f"ALTER {dataset.kind} {tmp} RENAME TO {name}")
+                con.execute("COMMIT")
+            except BaseException:
+                with contextlib.suppress(duckdb.Error):
+                    con.execute("ROLLBACK")
+                raise
+        except BaseException:
+            with contextlib.suppress(duckdb.Error):
+                con.execute(f"DROP {dataset.kind} IF EXISTS {tmp}")
+            if dataset.cached_path:
+                self.disk_cache.release(dataset.cached_path)
+            raise
+        if previous is not None and previous.cached_path:
+            self.disk_cache.release(previous.cached_path)
+        return columns, notes
+
+    @staticmethod
+    def _execute_query(con: duckdb.DuckDBPyConnection, query: str,
+                       limit: int, offset: int, fmt: str,
+                       owns_connection: bool = True):
+        """
+        Worker: run `query` on `con` and fetch its first page. `con` is
+        closed with the cursor if `owns_connection`.
+        """
+        cursor = None
+        try:
+            cursor = QueryCursor(con.execute(query), fmt, limit,
+                                 owns_connection)
+            cursor.skip(max(0, offset))
+            start = cursor.position
+            page = cursor.fetch_page(limit, MAX_RESULT_CHARS)
+        except BaseException:
+            if cursor is not None:
+                cursor.close()
+            elif owns_connection:
+                con.close()
+            raise
+        if cursor.exhausted:
+            cursor.close()
+        return cursor, start, page
+
+    @staticmethod
+    def _count_rows(con: duckdb.DuckDBPyConnection,
+                    query: str) -> Optional[int]:
+        """Worker: total row count of a row query."""
+        return con.execute(
+            f"SELECT count(*) FROM ({query.strip().rstrip(';')})"
+        ).fetchone()[0]
+
+    async def load_data(self, file_path: str, name: str = "data",
+                        mode: str = "view", profile: bool = True) -> str:
+        if not DATASET_NAME.match(name):
+            return f"Error loading data: invalid dataset name '{name}'."
+        if mode not in ("view", "table"):
+            return f"Error loading data: unknown mode '{mode}'."
+        if not any(c in file_path for c in "*?[") and \
+                not os.path.exists(file_path):
+            return f"Error loading data: file {file_path} does not exist."
+
+        dataset = Dataset(name=name, path=file_path,
+                          fmt=sniff_format(file_path), mode=mode)
+        self._close_cursors()
+        self.result_cache.clear()
+        previous = self.datasets.get(name)
         try:
-            self.data = pd.read_csv(file_path)
-            return f"Data loaded from {file_path}"
-        except (pd.errors.ParserError, FileNotFoundError) as e:
+            columns, notes = await self._run(
+                LOAD_TIMEOUT, self._create_dataset, dataset, previous,
+                profile)
+        except TimeoutError:
+            return (f"Error loading data: cancelled after exceeding the "
+                    f"{LOAD_TIMEOUT:g}s timeout.")
+        except (duckdb.Error, OSError) as e:
             return f"Error loading data: {str(e)}"
 
-    async def query_data(self, query: str) -> str:
-        if self.data is None:
+        self.datasets[name] = dataset
+        schema = ", ".join(f"{column[0]} {column[1]}" for column in columns)
+        response = (f"Data loaded from {file_path} as {dataset.fmt} "
+                    f"{dataset.mode} '{name}' ({schema})")
+        if dataset.profile is not None:
+            response += "\n\n" + render_profile(name, dataset.profile)
+        return await self._engine_report(response, notes)
+
+    async def profile(self, name: str = "data") -> str:
+        dataset = self.datasets.get(name)
+        if dataset is None:
+            return f"Error, no dataset named '{name}' is loaded."
+        if dataset.profile is None:
+            try:
+                columns = await self._run(
+                    LOAD_TIMEOUT, lambda con: con.execute(
+                        f"DESCRIBE {quote_identifier(name)}").fetchall())
+                await self._run(LOAD_TIMEOUT, self._profile_dataset,
+                                dataset, columns)
+            except TimeoutError:
+                return (f"Error profiling data: cancelled after exceeding "
+                        f"the {LOAD_TIMEOUT:g}s timeout.")
+            except (duckdb.Error, OSError) as e:
+                return f"Error profiling data: {str(e)}"
+        return render_profile(name, dataset.profile)
+
+    async def list_datasets(self) -> str:
+        if not self.datasets:
+            return "No datasets loaded."
+        return "\n".join(
+            f"- {d.name}: {d.fmt} {d.mode} from {d.path}"
+            + (" (cached as parquet)" if d.cached_path else "")
+            for d in self.datasets.values())
+
+    async def query_data(self, query: str, limit: int = PAGE_ROWS,
+                         offset: int = 0, fmt: str = "markdown",
+                         timeout: float = QUERY_TIMEOUT,
+                         count_rows: bool = False) -> str:
+        if not self.datasets:
             return "Error, no data loaded."
+        if fmt not in RESULT_FORMATS:
+            return f"Error executing query: unknown format '{fmt}'."
+        if offset >= MAX_RESULT_ROWS:
+            return (f"Error executing query: offset is beyond the row "
+                    f"budget of {MAX_RESULT_ROWS} rows.")
+        limit = max(1, min(limit, MAX_RESULT_ROWS - max(0, offset)))
+        timeout = min(timeout, MAX_QUERY_TIMEOUT)
+        self._close_cursors(expired_only=True)
+
+        cache_key = None
+        row_query = is_row_query(query)
+        if row_query:
+            normalized = normalize_sql(query)
+            if is_cacheable(normalized):
+                cache_key = (normalized, limit, offset, fmt, count_rows,
+                             self._fingerprint())
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    return await self._engine_report(cached, [])
+        else:
+            self.generation += 1
+
         try:
-            con = duckdb.connect(database=':memory:')
-            con.register('data', self.data)
-            result = con.execute(query).fetchdf()
-            return result.to_string()
+            notes = await self._relieve_memory_pressure()
+        except TimeoutError:
+            return f"Error executing query: {SERVER_BUSY}"
+        session = self._uses_session(query)
+        started = time.monotonic()
+        try:
+            async with self._query_connection(session) as con:
+                cursor, start, page = await run_interruptible(
+                    con, timeout, self._execute_query,
+                    con, query, limit, offset, fmt, not session)
+        except TimeoutError:
+            self.aborts.timeout += 1
+            return (f"Error executing query: cancelled after exceeding the "
+                    f"{timeout:g}s timeout.")
+        except asyncio.CancelledError:
+            self.aborts.cancelled += 1
+            raise
+        except duckdb.OutOfMemoryException as e:
+            self.aborts.memory += 1
+            return ("Error executing query: cancelled after exceeding the "
+                    f"engine memory limit. {str(e).splitlines()[0]}")
         except (duckdb.Error, KeyError, ValueError) as e:
             return f"Error executing query: {str(e)}"
 
+        total_rows = cursor.position if cursor.exhausted else None
+        if total_rows is None and count_rows and row_query:
+            remaining = timeout - (time.monotonic() - started)
+            with contextlib.suppress(duckdb.Error, TimeoutError):
+                total_rows = await self._run(max(remaining, STATUS_TIMEOUT),
+                                             self._count_rows, query,
+                                             session=session)
+
+        budget_reached = self._row_budget_reached(cursor)
+        more_rows = session and not cursor.exhausted
+        if more_rows:
+            # The next statement on the session connection drops the result
+            cursor.close()
+        response = f"{page}\n\n{page_footer(cursor, start, total_rows)}"
+        if budget_reached:
+            response += ROW_BUDGET_NOTE
+        elif more_rows:
+            response += (" More rows available: run the query again with "
+                         f"offset={cursor.position}.")
+        if cursor.exhausted:
+            if cache_key is not None:
+                self.result_cache.put(cache_key, response)
+        else:
+            self.cursors[cursor.id] = cursor
+        return await self._engine_report(response, notes)
+
+    async def fetch_rows(self, cursor_id: str, limit: int = PAGE_ROWS,
+                         timeout: float = QUERY_TIMEOUT) -> str:
+        # Taken out of the registry while in use, so a concurrent call with
+        # the same cursor_id cannot read from it at the same time
+        cursor = self.cursors.pop(cursor_id, None)
+        if cursor is None:
+            return (f"Error, cursor '{cursor_id}' does not exist, is in use "
+                    "or was closed. Run the query again.")
+        start = cursor.position
+        limit = max(1, min(limit, MAX_RESULT_ROWS - start))
+        timeout = min(timeout, MAX_QUERY_TIMEOUT)
+        try:
+            page = await run_interruptible(
+                cursor.cursor, timeout, cursor.fetch_page,
+                limit, MAX_RESULT_CHARS)
+        except TimeoutError:
+            cursor.close()
+            self.aborts.timeout += 1
+            return (f"Error fetching rows: cancelled after exceeding the "
+                    f"{timeout:g}s timeout.")
+        except asyncio.CancelledError:
+            cursor.close()
+            self.aborts.cancelled += 1
+            raise
+        except duckdb.OutOfMemoryException as e:
+            cursor.close()
+            self.aborts.memory += 1
+            return ("Error fetching rows: cancelled after exceeding the "
+                    f"engine memory limit. {str(e).splitlines()[0]}")
+        except duckdb.Error as e:
+            cursor.close()
+            return f"Error fetching rows: {str(e)}"
+        budget_reached = self._row_budget_reached(cursor)
+        footer = page_footer(cursor, start, None)
+        if budget_reached:
+            footer += ROW_BUDGET_NOTE
+        if cursor.exhausted:
+            cursor.close()
+        else:
+            self.cursors[cursor_id] = cursor
+        return await self._engine_report(f"{page}\n\n{footer}", [])
+
+    async def close_cursor(self, cursor_id: str) -> str:
+        cursor = self.cursors.pop(cursor_id, None)
+        if cursor is None:
+            return f"Cursor '{cursor_id}' is not open."
+        cursor.close()
+        return f"Cursor '{cursor_id}' closed."
+
+    async def stats(self) -> str:
+        try:
+            engine = (await self._status()).summary()
+        except TimeoutError:
+            engine = f"[engine] status unavailable, {SERVER_BUSY}"
+        except duckdb.Error as e:
+            engine = f"[engine] status unavailable: {str(e)}"
+        return "\n".join([
+            f"Datasets: {len(self.datasets)}, open cursors: "
+            f"{len(self.cursors)}",
+            engine,
+            self.aborts.summary(),
+            self.result_cache.stats(),
+        ] + ([self.disk_cache.stats()] if self.disk_cache else []))
+
+    async def memory_used(self) -> int:
+        """Engine memory held by the session, 0 before its first use."""
+        if self.con is None:
+            return 0
+        return (await self._status()).memory_used
+
     async def create_new_directory(self, dir_name: str) -> str:
         try:
             dir_ = self.working_dir+"/"+dir_name
@@ -47,43 +647,312 @@ class DataFlowSession:
         except OSError as e:
             return f"Error creating folder: {str(e)}"
 
+    def set_memory_limit(self, memory_limit: str):
+        """Change the engine memory limit, also of an open connection."""
+        self.engine.memory_limit = memory_limit
+        with self._lock:
+            if self.con is not None:
+                self.con.execute("SET memory_limit = ?", [memory_limit])
+
+    def close(self):
+        """Drop the loaded datasets and close the DuckDB connection."""
+        self._close_cursors()
+        self.result_cache.clear()
+        for dataset in self.datasets.values():
+            if dataset.cached_path:
+                self.disk_cache.release(dataset.cached_path)
+        self.datasets.clear()
+        with self._lock:
+            if self.con is not None:
+                self.con.close()
+                self.con = None
+
+
+class SessionRegistry:
+    """
+    One DataFlowSession per connected MCP client, so concurrent agents never
+    see each other's datasets. Clients are told apart by their transport
+    session, never by ids they send themselves, so a client cannot attach
+    to the session of another; calls made outside of a request share the
+    'local' session.
+
+    Every session has its own DuckDB database and spill directory. Sessions
+    unused for SESSION_IDLE_TIMEOUT seconds are closed by a background task.
+    When MAX_SESSIONS are open, or the sessions together hold more than
+    TOTAL_MEMORY of engine memory, idle sessions are evicted least recently
+    used first to make room for a new one; if none is idle, ServerAtCapacity
+    is raised. With TOTAL_MEMORY set (and no DATAFLOW_MEMORY_LIMIT), the
+    memory limit of every session is its share of TOTAL_MEMORY among the
+    open sessions, updated whenever a session is opened or closed.
+    """
+
+    def __init__(self):
+        self.working_dir = os.environ.get("MCP_FILESYS_DIR", None)
+        self.sessions: OrderedDict[str, DataFlowSession] = OrderedDict()
+        self.disk_cache: Optional[ColumnarCache] = None
+        if self.working_dir:
+            self.disk_cache = ColumnarCache(
+                os.path.join(self.working_dir, ".dataflow_cache"),
+                DISK_CACHE_BYTES, DISK_CACHE_MAX_AGE)
+        self.evictions = 0
+        self._keys = weakref.WeakKeyDictionary()
+        self._reaper: Optional[asyncio.Task] = None
+
+    def _key(self, ctx: Optional[Context]) -> str:
+        try:
+            transport_session = ctx.session
+        except (AttributeError, ValueError):
+            return "local"
+        key = self._keys.get(transport_session)
+        if key is None:
+            key = f"session-{secrets.token_hex(6)}"
+            self._keys[transport_session] = key
+        return key
+
+    def _engine_settings(self, key: str) -> EngineSettings:
+        engine = EngineSettings.from_env(self.working_dir)
+        if engine.temp_directory:
+            engine.temp_directory = os.path.join(engine.temp_directory, key)
+        return engine
+
+    def _rebalance(self):
+        """Share TOTAL_MEMORY among the open sessions."""
+        if not TOTAL_MEMORY or os.environ.get("DATAFLOW_MEMORY_LIMIT"):
+            return
+        share = f"{TOTAL_MEMORY // max(1, len(self.sessions))}B"
+        for session in self.sessions.values():
+            with contextlib.suppress(duckdb.Error):
+                session.set_memory_limit(share)
+
+    def _evict(self, key: str):
+        session = self.sessions.pop(key)
+        session.close()
+        if session.engine.temp_directory:
+            shutil.rmtree(session.engine.temp_directory, ignore_errors=True)
+        self.evictions += 1
+
+    async def _memory_used(self) -> int:
+        """
+        Engine memory of all sessions. A session too busy to answer is
+        counted at its memory limit.
+        """
+        used = 0
+        for session in list(self.sessions.values()):
+            try:
+                used += await session.memory_used()
+            except (TimeoutError, duckdb.Error):
+                used += parse_bytes(session.engine.memory_limit or "") or 0
+        return used
+
+    async def _make_room(self):
+        while True:
+            full = len(self.sessions) >= MAX_SESSIONS
+            if not full and TOTAL_MEMORY:
+                full = await self._memory_used() >= TOTAL_MEMORY
+            if not full:
+                return
+            idle = next((key for key, session in self.sessions.items()
+                         if session.active_calls == 0), None)
+            if idle is None:
+                raise ServerAtCapacity(
+                    "the dataflow server is at capacity, try again later.")
+            self._evict(idle)
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(min(60.0, SESSION_IDLE_TIMEOUT / 2))
+            now = time.monotonic()
+            evicted = False
+            for key, session in list(self.sessions.items()):
+                if session.active_calls == 0 and \
+                        now - session.last_used > SESSION_IDLE_TIMEOUT:
+                    self._evict(key)
+                    evicted = True
+            if evicted:
+                self._rebalance()
+
+    @contextlib.asynccontextmanager
+    async def session(self, ctx: Optional[Context]
+                      ) -> AsyncIterator[DataFlowSession]:
+        """The session of the client making the request."""
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap())
+        key = self._key(ctx)
+        if key not in self.sessions:
+            await self._make_room()
+        session = self.sessions.get(key)
+        if session is None:
+            session = DataFlowSession(self._engine_settings(key),
+                                      self.disk_cache)
+            self.sessions[key] = session
+            self._rebalance()
+        self.sessions.move_to_end(key)
+        session.active_calls += 1
+        try:
+            yield session
+        finally:
+            session.active_calls -= 1
+            session.last_used = time.monotonic()
+
+    def stats(self) -> str:
+        return (f"Sessions: {len(self.sessions)} of {MAX_SESSIONS}, "
+                f"{self.evictions} evicted")
+
+    def close(self):
+        for key in list(self.sessions):
+            self._evict(key)
+
+
+registry = SessionRegistry()
+atexit.register(registry.close)
+atexit.register(executor.shutdown, wait=False, cancel_futures=True)
+atexit.register(status_executor.shutdown, wait=False, cancel_futures=True)
+
+
+async def in_session(ctx: Optional[Context],
+                     call: Callable[[DataFlowSession], Awaitable[str]]
+                     ) -> str:
+    """Run a tool `call` in the session of the client making the request."""
+    try:
+        async with registry.session(ctx) as session:
+            return await call(session)
+    except ServerAtCapacity as e:
+        return f"Error: {str(e)}"
+
+
+@mcp.tool()
+async def dataflow_load_data(file_path: str, name: str = "data",
+                             mode: str = "view", profile: bool = True,
+                             ctx: Context = None) -> str:
+    """
+    Load data from a CSV, Parquet or JSON file into the session. The format
+    is detected automatically. Several datasets can be loaded at once under
+    different names; loading a name again replaces it.
+
+    The response includes a profile of the data: row count and, for every
+    column, its type, null rate, min, max, approximate distinct count and
+    most frequent values. There is no need to run DESCRIBE, COUNT(*) or
+    sample queries after loading. Views that would have to scan the whole
+    file are not profiled on load: use dataflow_profile for them.
 
-session = DataFlowSession()
+    Args:
+        file_path: The absolute path the file (glob patterns are allowed)
+        name: Table name used to query the dataset. Defaults to 'data'.
+        mode: 'view' scans the file lazily on every query (default, best for
+            large files), 'table' loads it into memory once.
+        profile: Set to False to skip profiling very large files.
+    """
+    return await in_session(ctx, lambda session: session.load_data(
+        file_path, name, mode, profile))
 
 
 @mcp.tool()
-async def dataflow_load_data(file_path: str) -> str:
+async def dataflow_profile(name: str = "data", ctx: Context = None) -> str:
     """
-    Load data from a file into the session.
+    Profile of a loaded dataset: row count and, for every column, its type,
+    null rate, min, max, approximate distinct count and most frequent
+    values.
 
     Args:
-        file_path: The absolute path the file
+        name: Name of the dataset. Defaults to 'data'.
     """
-    return await session.load_data(file_path)
+    return await in_session(ctx, lambda session: session.profile(name))
 
 
 @mcp.tool()
-async def dataflow_query_data(sql_query: str) -> str:
+async def dataflow_list_datasets(ctx: Context = None) -> str:
+    """
+    List the datasets loaded in the session with their format and source.
+    """
+    return await in_session(ctx, lambda session: session.list_datasets())
+
+
+@mcp.tool()
+async def dataflow_query_data(sql_query: str, limit: int = PAGE_ROWS,
+                              offset: int = 0,
+                              result_format: str = "markdown",
+                              timeout_seconds: float = QUERY_TIMEOUT,
+                              count_rows: bool = False,
+                              ctx: Context = None) -> str:
     """
     Query the loaded data. Data must first be loaded using the
-    dataflow_load_data tool, data is located in table 'data'.
+    dataflow_load_data tool, each dataset is located in the table named
+    when it was loaded ('data' by default).
+
+    Only one page of the result is returned, followed by a line with the
+    row range and, when more rows exist, a cursor_id to pass to
+    dataflow_fetch_rows. The total row count is given when the whole
+    result fits in the page, or on request. Prefer aggregations and LIMIT
+    over paging through large results.
 
     Args:
         sql_query: A valid SQL query.
+        limit: Maximum number of rows in the page.
+        offset: Number of rows to skip before the page.
+        result_format: 'markdown' (default), 'csv' or 'arrow' (base64
+            Arrow IPC stream, for programs rather than for reading).
+        timeout_seconds: The query is cancelled if it runs longer (at
+            most DATAFLOW_MAX_QUERY_TIMEOUT seconds).
+        count_rows: Also count all rows of a result larger than the page.
+            This runs the query a second time, so only ask when needed.
+    """
+    return await in_session(ctx, lambda session: session.query_data(
+        sql_query, limit, offset, result_format, timeout_seconds,
+        count_rows))
+
+
+@mcp.tool()
+async def dataflow_fetch_rows(cursor_id: str, limit: int = PAGE_ROWS,
+                              ctx: Context = None) -> str:
+    """
+    Fetch the next page of a query result returned by dataflow_query_data.
+
+    Args:
+        cursor_id: The cursor_id given at the end of the previous page.
+        limit: Maximum number of rows in the page.
+    """
+    return await in_session(ctx, lambda session: session.fetch_rows(
+        cursor_id, limit))
+
+
+@mcp.tool()
+async def dataflow_close_cursor(cursor_id: str,
+                                ctx: Context = None) -> str:
     """
-    return await session.query_data(sql_query)
+    Release a query cursor that will not be read any further.
+
+    Args:
+        cursor_id: The cursor_id given at the end of a page.
+    """
+    return await in_session(ctx, lambda session: session.close_cursor(
+        cursor_id))
+
+
+@mcp.tool()
+async def dataflow_stats(ctx: Context = None) -> str:
+    """
+    Report diagnostics of the dataflow server and session: open sessions,
+    loaded datasets, open cursors, engine memory and spill usage, aborted
+    queries and result cache hits and misses.
+    """
+    async def stats(session: DataFlowSession) -> str:
+        return registry.stats() + "\n" + await session.stats()
+
+    return await in_session(ctx, stats)
 
 
 @mcp.tool()
-async def dataflow_create_new_directory(dir_name: str) -> str:
+async def dataflow_create_new_directory(dir_name: str,
+                                        ctx: Context = None) -> str:
     """
     Create a new directory with directory name given by parameter.
 
     Args:
         dir_name: A valid directory name.
     """
-    return await session.create_new_directory(dir_name)
+    return await in_session(ctx, lambda session: session.create_new_directory(
+        dir_name))
 
 
-if __name__ == "__name__":
+if __name__ == "__main__":
     mcp.run(transport='stdio')
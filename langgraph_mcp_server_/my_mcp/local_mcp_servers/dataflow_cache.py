@@ -0,0 +1,261 @@
+"""
+Caches used by the dataflow server.
+
+ResultCache keeps the rendered results of recent queries in memory, keyed
+by the normalized SQL text and a fingerprint of the datasets it ran
+against, and evicts the least recently used results once a byte budget is
+exceeded.
+
+ColumnarCache keeps Parquet copies of ingested text files on disk, so a
+file that has not changed is parsed only once across loads and server
+restarts.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+import duckdb
+
+
+QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+WHITESPACE = re.compile(r"\s+")
+PUNCTUATION_SPACE = re.compile(r"\s*([(),;=<>])\s*")
+VOLATILE = re.compile(
+    r"\b(random|uuid|gen_random_uuid|now|current_date|current_time|"
+    r"current_timestamp|get_current_time|nextval|setseed)\b")
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Canonical form of a query: keywords and identifiers lowercased and
+    whitespace collapsed, string literals and quoted identifiers untouched.
+    """
+    parts = QUOTED.split(query.strip().rstrip(";").strip())
+    for i in range(0, len(parts), 2):
+        part = WHITESPACE.sub(" ", parts[i].lower())
+        parts[i] = PUNCTUATION_SPACE.sub(r"\1", part)
+    return "".join(parts)
+
+
+def split_statements(query: str) -> List[str]:
+    """
+    The statements of `query`. Text that does not parse is returned whole,
+    running it reports the error.
+    """
+    try:
+        return [statement.query.strip()
+                for statement in duckdb.extract_statements(query)]
+    except duckdb.Error:
+        return [query]
+
+
+def is_row_query(query: str) -> bool:
+    """
+    Whether `query` is a single SELECT (or FROM, VALUES, TABLE...)
+    statement. Batches of several statements are not, whatever they start
+    with, since any of them may change the database.
+    """
+    try:
+        statements = duckdb.extract_statements(query)
+    except duckdb.Error:
+        return False
+    return len(statements) == 1 and \
+        statements[0].type == duckdb.StatementType.SELECT
+
+
+def is_cacheable(normalized_query: str) -> bool:
+    """Results of queries calling volatile functions must not be reused."""
+    unquoted = QUOTED.sub("", normalized_query)
+    return VOLATILE.search(unquoted) is None
+
+
+class ResultCache:
+    """
+    LRU cache of rendered query results bounded by `max_bytes`.
+
+    Keys are built by the caller and must include everything the result
+    depends on (normalized SQL, paging arguments and dataset fingerprint),
+    so entries of reloaded or modified data are never returned.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, str] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _size(key: Hashable, value: str) -> int:
+        return len(value) + len(repr(key))
+
+    def get(self, key: Hashable) -> Optional[str]:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: str):
+        size = self._size(key, value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.bytes -= self._size(key, self._entries.pop(key))
+        self._entries[key] = value
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            old_key, old_value = self._entries.popitem(last=False)
+            self.bytes -= self._size(old_key, old_value)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return (f"Result cache: {len(self)} entries, {self.bytes} of "
+                f"{self.max_bytes} bytes, {self.hits} hits, {self.misses} "
+                f"misses ({hit_rate:.0%} hit rate), {self.evictions} "
+                "evictions")
+
+
+class ColumnarCache:
+    """
+    Directory of Parquet copies of source files.
+
+    Entries are named after the SHA-256 of the source file's absolute path,
+    size and mtime, so finding the copy of a file never reads the file, and
+    a modified file gets a new entry. Entries not used for `max_age` seconds
+    are removed, and the least recently used ones are removed while the
+    directory holds more than `max_bytes`. The profile of each entry is
+    stored next to it as JSON. Eviction is guarded by a lock so loads can
+    run on several threads, and each entry is written by one thread at a
+    time: concurrent loads of the same file wait for the first conversion
+    and reuse it. Copies in use by a dataset are pinned and never evicted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_age: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._copy_locks: Dict[str, threading.Lock] = {}
+        # cached file -> number of datasets reading it
+        self._pins: Dict[str, int] = {}
+
+    @staticmethod
+    def _digest(file_path: str) -> str:
+        stat = os.stat(file_path)
+        key = f"{os.path.abspath(file_path)}\0{stat.st_size}\0" \
+            f"{stat.st_mtime_ns}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def columnar_copy(self, con: duckdb.DuckDBPyConnection, file_path: str,
+                      scan: str) -> str:
+        """
+        Path of the Parquet copy of `file_path`, converting it with the
+        DuckDB scan expression `scan` if it is not cached yet. The copy is
+        pinned until `release` is called once for every time it was
+        returned.
+        """
+        digest = self._digest(file_path)
+        cached_file = os.path.join(self.directory, digest + ".parquet")
+        with self._lock:
+            copy_lock = self._copy_locks.setdefault(digest, threading.Lock())
+        with copy_lock:
+            with self._lock:
+                if os.path.exists(cached_file):
+                    self._pin(cached_file)
+                    os.utime(cached_file)
+                    return cached_file
+
+            tmp_file = f"{cached_file}.{uuid.uuid4().hex}.tmp"
+            target = tmp_file.replace("'", "''")
+            try:
+                con.execute(f"COPY (SELECT * FROM {scan}) TO "
+                            f"'{target}' (FORMAT PARQUET)")
+                os.replace(tmp_file, cached_file)
+            finally:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+        with self._lock:
+            self._pin(cached_file)
+            self.evict()
+        return cached_file
+
+    def _pin(self, cached_file: str):
+        self._pins[cached_file] = self._pins.get(cached_file, 0) + 1
+
+    def release(self, cached_file: str):
+        """Unpin a copy returned by `columnar_copy` that is no longer read."""
+        with self._lock:
+            count = self._pins.pop(cached_file, 0) - 1
+            if count > 0:
+                self._pins[cached_file] = count
+
+    @staticmethod
+    def _profile_file(cached_file: str) -> str:
+        return cached_file[:-len(".parquet")] + ".profile.json"
+
+    def load_profile(self, cached_file: str) -> Optional[dict]:
+        try:
+            with open(self._profile_file(cached_file), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_profile(self, cached_file: str, profile: dict):
+        profile_file = self._profile_file(cached_file)
+        tmp_file = f"{profile_file}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(profile, f)
+        os.replace(tmp_file, profile_file)
+
+    def evict(self):
+        """
+        Remove expired entries, then the oldest ones while over budget,
+        except pinned ones. Callers must hold the cache lock.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".parquet"):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        for used, size, path in entries:
+            if path in self._pins:
+                continue
+            if total <= self.max_bytes and now - used <= self.max_age:
+                continue
+            os.remove(path)
+            if os.path.exists(self._profile_file(path)):
+                os.remove(self._profile_file(path))
+            total -= size
+
+    def stats(self) -> str:
+        files = [os.path.join(self.directory, name)
+                 for name in os.listdir(self.directory)
+                 if name.endswith(".parquet")]
+        size = sum(os.path.getsize(path) for path in files)
+        return (f"Columnar cache: {len(files)} files, {size} of "
+                f"{self.max_bytes} bytes in {self.directory}")
@@ -0,0 +1,189 @@
+"""
+Resource settings and usage reporting for the dataflow DuckDB engine.
+
+DuckDB runs out-of-core once a memory limit and a temp directory are set:
+sorts, joins, aggregations and table loads that do not fit in memory are
+spilled to the temp directory instead of failing.
+
+All DuckDB work of the server runs on a bounded thread pool through
+run_interruptible, which also enforces per-call timeouts counted from the
+moment the work starts running. Engine status probes run on a pool of
+their own so they are not queued behind long queries. Queries stopped
+by a timeout, a cancellation, the row budget or the memory limit are
+counted in AbortStats.
+"""
+
+import asyncio
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional
+import duckdb
+
+
+SIZE = re.compile(r"^\s*([\d.]+)\s*([KMGT]?i?B|bytes)?\s*$", re.IGNORECASE)
+SIZE_UNITS = {"": 1, "bytes": 1, "b": 1,
+              "kb": 1000, "mb": 1000 ** 2, "gb": 1000 ** 3, "tb": 1000 ** 4,
+              "kib": 1024, "mib": 1024 ** 2, "gib": 1024 ** 3,
+              "tib": 1024 ** 4}
+PRESSURE_RATIO = 0.8
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def parse_bytes(size: str) -> Optional[int]:
+    """Parse sizes such as '512MB', '2 GiB' or '1024' into bytes."""
+    match = SIZE.match(size or "")
+    if not match:
+        return None
+    unit = (match.group(2) or "").lower()
+    return int(float(match.group(1)) * SIZE_UNITS[unit])
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else \
+                f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TiB"
+
+
+@dataclass
+class EngineSettings:
+    """
+    DuckDB resource settings read from DATAFLOW_MEMORY_LIMIT,
+    DATAFLOW_TEMP_DIR, DATAFLOW_MAX_SPILL, DATAFLOW_THREADS and
+    DATAFLOW_PRESERVE_ORDER. Insertion order is not preserved by default
+    once a memory limit is set, which lets DuckDB stream large loads and
+    copies instead of buffering them (queries still honour ORDER BY).
+    """
+    memory_limit: Optional[str] = None
+    temp_directory: Optional[str] = None
+    max_temp_directory_size: Optional[str] = None
+    threads: Optional[int] = None
+    preserve_insertion_order: bool = True
+
+    @classmethod
+    def from_env(cls, working_dir: Optional[str]) -> "EngineSettings":
+        temp_directory = os.environ.get("DATAFLOW_TEMP_DIR")
+        if temp_directory is None and working_dir:
+            temp_directory = os.path.join(working_dir, ".dataflow_spill")
+        threads = os.environ.get("DATAFLOW_THREADS")
+        memory_limit = os.environ.get("DATAFLOW_MEMORY_LIMIT")
+        preserve_order = os.environ.get(
+            "DATAFLOW_PRESERVE_ORDER", "false" if memory_limit else "true")
+        return cls(
+            memory_limit=memory_limit,
+            temp_directory=temp_directory,
+            max_temp_directory_size=os.environ.get("DATAFLOW_MAX_SPILL"),
+            threads=int(threads) if threads else None,
+            preserve_insertion_order=preserve_order.lower() in ("1", "true"),
+        )
+
+    def apply(self, con: duckdb.DuckDBPyConnection):
+        """Configure the connection; unset values keep DuckDB defaults."""
+        if self.memory_limit:
+            con.execute("SET memory_limit = ?", [self.memory_limit])
+        if self.temp_directory:
+            os.makedirs(self.temp_directory, exist_ok=True)
+            con.execute("SET temp_directory = ?", [self.temp_directory])
+        if self.max_temp_directory_size:
+            con.execute("SET max_temp_directory_size = ?",
+                        [self.max_temp_directory_size])
+        if self.threads:
+            con.execute(f"SET threads = {int(self.threads)}")
+        if not self.preserve_insertion_order:
+            con.execute("SET preserve_insertion_order = false")
+
+
+@dataclass
+class EngineStatus:
+    memory_used: int
+    memory_limit: Optional[int]
+    spilled: int
+
+    @property
+    def under_pressure(self) -> bool:
+        return bool(self.memory_limit) and \
+            self.memory_used >= PRESSURE_RATIO * self.memory_limit
+
+    def headroom(self) -> Optional[int]:
+        if not self.memory_limit:
+            return None
+        return max(0, self.memory_limit - self.memory_used)
+
+    def summary(self) -> str:
+        limit = format_bytes(self.memory_limit) if self.memory_limit \
+            else "unlimited"
+        return (f"[engine] memory {format_bytes(self.memory_used)} of "
+                f"{limit}, spilled {format_bytes(self.spilled)}")
+
+
+@dataclass
+class AbortStats:
+    timeout: int = 0
+    cancelled: int = 0
+    rows: int = 0
+    memory: int = 0
+
+    def summary(self) -> str:
+        return (f"Aborted queries: {self.timeout} timed out, "
+                f"{self.cancelled} cancelled, {self.rows} over the row "
+                f"budget, {self.memory} out of memory")
+
+
+def engine_status(con: duckdb.DuckDBPyConnection) -> EngineStatus:
+    """Current buffer manager memory, memory limit and spill usage."""
+    used, spilled = con.execute(
+        "SELECT coalesce(sum(memory_usage_bytes), 0), "
+        "coalesce(sum(temporary_storage_bytes), 0) FROM duckdb_memory()"
+    ).fetchone()
+    limit = con.execute(
+        "SELECT current_setting('memory_limit')").fetchone()[0]
+    return EngineStatus(memory_used=int(used),
+                        memory_limit=parse_bytes(limit),
+                        spilled=int(spilled))
+
+
+executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("DATAFLOW_WORKERS", 4)),
+    thread_name_prefix="dataflow")
+status_executor = ThreadPoolExecutor(max_workers=1,
+                                     thread_name_prefix="dataflow-status")
+
+
+async def run_interruptible(con: duckdb.DuckDBPyConnection, timeout: float,
+                            fn: Callable, *args,
+                            pool: ThreadPoolExecutor = executor):
+    """
+    Run blocking DuckDB work `fn(*args)` on the worker pool so the event
+    loop stays free. If it does not finish within `timeout` seconds of
+    starting to run (time spent waiting for a free worker does not count),
+    or the awaiting task is cancelled (e.g. the MCP client cancelled the
+    request), `con` is interrupted so the query stops inside DuckDB instead
+    of running on in the background. TimeoutError is raised on timeout.
+    """
+    loop = asyncio.get_running_loop()
+    started = asyncio.Event()
+
+    def work():
+        loop.call_soon_threadsafe(started.set)
+        return fn(*args)
+
+    future = loop.run_in_executor(pool, work)
+    try:
+        await started.wait()
+        return await asyncio.wait_for(future, timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        # Work still waiting for a worker is dropped, running work stopped
+        future.cancel()
+        con.interrupt()
+        raise
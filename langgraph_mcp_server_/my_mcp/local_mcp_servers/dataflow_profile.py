@@ -0,0 +1,77 @@
+"""
+Dataset profiles computed when data is loaded.
+
+A profile answers the questions an agent would otherwise ask with several
+DESCRIBE, COUNT(*) and SELECT * LIMIT 5 round-trips: the schema, the row
+count and, per column, the null rate, min/max, approximate number of
+distinct values and most frequent values. All of it is computed with a
+single aggregate query, i.e. one pass over the data.
+"""
+
+from typing import List, Sequence, Tuple
+import duckdb
+from dataflow_engine import quote_identifier
+from dataflow_results import encode_markdown_row
+
+TOP_VALUES = 3
+MAX_VALUE_CHARS = 40
+
+
+def build_profile(con: duckdb.DuckDBPyConnection, table: str,
+                  columns: Sequence[Tuple[str, str]]) -> dict:
+    """Profile `table`, whose (name, type) pairs are `columns`."""
+    aggregates = ["count(*)"]
+    for name, _ in columns:
+        column = quote_identifier(name)
+        aggregates += [
+            f"count({column})",
+            f"min({column})::VARCHAR",
+            f"max({column})::VARCHAR",
+            f"approx_count_distinct({column})",
+            f"approx_top_k({column}, {TOP_VALUES})::VARCHAR[]",
+        ]
+    row = con.execute(f"SELECT {', '.join(aggregates)} "
+                      f"FROM {quote_identifier(table)}").fetchone()
+
+    rows = row[0]
+    profile = {"rows": rows, "columns": []}
+    for i, (name, column_type) in enumerate(columns):
+        non_null, minimum, maximum, distinct, top = row[1 + 5 * i:6 + 5 * i]
+        profile["columns"].append({
+            "name": name,
+            "type": column_type,
+            "null_rate": (rows - non_null) / rows if rows else 0.0,
+            "min": minimum,
+            "max": maximum,
+            "distinct": distinct,
+            "top": top or [],
+        })
+    return profile
+
+
+def _short(value) -> str:
+    text = "" if value is None else str(value)
+    if len(text) > MAX_VALUE_CHARS:
+        text = text[:MAX_VALUE_CHARS - 3] + "..."
+    return text
+
+
+def render_profile(table: str, profile: dict) -> str:
+    """Compact markdown rendering of a profile."""
+    lines: List[str] = [
+        f"Profile of '{table}': {profile['rows']} rows, "
+        f"{len(profile['columns'])} columns",
+        encode_markdown_row(["column", "type", "nulls", "min", "max",
+                             "distinct (approx)", "top values"]),
+        "|" + "---|" * 7,
+    ]
+    for column in profile["columns"]:
+        # Top values say nothing about (nearly) unique columns such as ids
+        unique = column["distinct"] >= 0.9 * profile["rows"]
+        top = "" if unique else ", ".join(_short(v) for v in column["top"])
+        lines.append(encode_markdown_row([
+            column["name"], column["type"], f"{column['null_rate']:.1%}",
+            _short(column["min"]), _short(column["max"]),
+            column["distinct"], top,
+        ]))
+    return "\n".join(lines)
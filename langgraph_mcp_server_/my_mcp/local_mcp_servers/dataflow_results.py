@@ -0,0 +1,216 @@
+"""
+Server-side cursors and compact encodings for dataflow query results.
+
+A QueryCursor keeps a DuckDB result open and hands it out one page at a
+time, so the server never holds more than a page of rows in Python memory
+and the agent never receives more text than it asked for.
+"""
+
+import base64
+import csv
+import io
+import secrets
+import time
+from typing import List, Optional, Sequence
+import duckdb
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow output is only available with pyarrow installed
+    pa = None
+
+
+RESULT_FORMATS = ("markdown", "csv", "arrow")
+MAX_CELL_CHARS = 200
+SKIP_CHUNK_ROWS = 10_000
+
+
+def format_cell(value) -> str:
+    text = "" if value is None else str(value)
+    if len(text) > MAX_CELL_CHARS:
+        text = text[:MAX_CELL_CHARS - 3] + "..."
+    return text
+
+
+def encode_markdown_row(values: Sequence) -> str:
+    cells = (format_cell(v).replace("|", "\\|").replace("\n", " ")
+             for v in values)
+    return "| " + " | ".join(cells) + " |"
+
+
+def encode_csv_row(values: Sequence) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(
+        [format_cell(v) for v in values])
+    return buffer.getvalue().rstrip("\n")
+
+
+class QueryCursor:
+    """
+    An open query result that is fetched incrementally.
+
+    Text formats ('markdown', 'csv') pull rows with fetchmany and stop
+    adding rows to a page once it reaches max_chars; rows that did not fit
+    are kept for the next page. The 'arrow' format streams Arrow record
+    batches of `batch_rows` rows, slices them to the page limit, and cuts
+    the page further while its base64 IPC stream exceeds max_chars.
+    """
+
+    def __init__(self, cursor: duckdb.DuckDBPyConnection, fmt: str,
+                 batch_rows: int, owns_connection: bool = True):
+        self.id = secrets.token_hex(8)
+        self.cursor = cursor
+        self.owns_connection = owns_connection
+        self.fmt = fmt
+        self.columns = [column[0] for column in cursor.description]
+        self.position = 0
+        self.exhausted = False
+        self.last_used = time.monotonic()
+        self._pending: List = []
+        self._batches = None
+        if fmt == "arrow":
+            if pa is None:
+                raise ValueError("the 'arrow' format requires pyarrow")
+            self._batches = cursor.fetch_record_batch(batch_rows)
+
+    def skip(self, rows: int):
+        """Discard the next `rows` rows without keeping them in memory."""
+        while rows > 0 and not self.exhausted:
+            if self._batches is not None:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                if batch.num_rows > rows:
+                    self._pending = [batch.slice(rows)]
+                taken = min(rows, batch.num_rows)
+            else:
+                chunk = self._take(min(rows, SKIP_CHUNK_ROWS))
+                if not chunk:
+                    break
+                taken = len(chunk)
+            self.position += taken
+            rows -= taken
+
+    def fetch_page(self, limit: int, max_chars: int) -> str:
+        """Return the next page encoded in the cursor's format."""
+        self.last_used = time.monotonic()
+        if self._batches is not None:
+            return self._fetch_arrow(limit, max_chars)
+        return self._fetch_text(limit, max_chars)
+
+    def close(self):
+        self._pending = []
+        self._batches = None
+        self.exhausted = True
+        if self.owns_connection:
+            self.cursor.close()
+
+    def _take(self, limit: int) -> List:
+        rows = self._pending[:limit]
+        self._pending = self._pending[limit:]
+        if len(rows) < limit:
+            rows += self.cursor.fetchmany(limit - len(rows))
+        if not rows:
+            self.exhausted = True
+        return rows
+
+    def _peek(self):
+        if not self._pending and not self.exhausted:
+            if self._batches is not None:
+                batch = self._next_batch()
+                if batch is not None:
+                    self._pending = [batch]
+            else:
+                self._pending = self.cursor.fetchmany(1)
+                if not self._pending:
+                    self.exhausted = True
+
+    def _next_batch(self):
+        if self._pending:
+            return self._pending.pop(0)
+        try:
+            return self._batches.read_next_batch()
+        except StopIteration:
+            self.exhausted = True
+            return None
+
+    def _fetch_text(self, limit: int, max_chars: int) -> str:
+        if self.fmt == "csv":
+            encode = encode_csv_row
+            lines = [encode_csv_row(self.columns)]
+        else:
+            encode = encode_markdown_row
+            lines = [encode_markdown_row(self.columns),
+                     "|" + "---|" * len(self.columns)]
+        used = sum(len(line) + 1 for line in lines)
+
+        rows = self._take(limit)
+        emitted = 0
+        for row in rows:
+            line = encode(row)
+            if emitted and used + len(line) + 1 > max_chars:
+                break
+            lines.append(line)
+            used += len(line) + 1
+            emitted += 1
+        self._pending = rows[emitted:] + self._pending
+        if self._pending:
+            self.exhausted = False
+        self.position += emitted
+        self._peek()
+        return "\n".join(lines)
+
+    @staticmethod
+    def _encode_arrow(table) -> str:
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return "arrow-ipc-base64:" + base64.b64encode(
+            sink.getvalue()).decode("ascii")
+
+    def _fetch_arrow(self, limit: int, max_chars: int) -> str:
+        batches = []
+        rows = 0
+        while rows < limit:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            if rows + batch.num_rows > limit:
+                self._pending.insert(0, batch.slice(limit - rows))
+                batch = batch.slice(0, limit - rows)
+            batches.append(batch)
+            rows += batch.num_rows
+        table = pa.Table.from_batches(batches, self._batches.schema)
+        page = self._encode_arrow(table)
+        # Keep the share of rows that fits, at least one row per page
+        while len(page) > max_chars and table.num_rows > 1:
+            keep = max(1, min(table.num_rows - 1,
+                              table.num_rows * max_chars // len(page)))
+            self._pending[:0] = [batch for batch in
+                                 table.slice(keep).to_batches()
+                                 if batch.num_rows]
+            table = table.slice(0, keep)
+            page = self._encode_arrow(table)
+        if self._pending:
+            self.exhausted = False
+        self.position += table.num_rows
+        self._peek()
+        return page
+
+
+def page_footer(cursor: QueryCursor, start: int,
+                total_rows: Optional[int]) -> str:
+    """Describe which rows a page holds and how to continue reading."""
+    end = cursor.position
+    if end == start:
+        footer = "No rows returned."
+        if total_rows:
+            footer = f"No rows returned, the result has {total_rows} rows."
+    elif total_rows is not None:
+        footer = f"Rows {start + 1}-{end} of {total_rows}."
+    else:
+        footer = f"Rows {start + 1}-{end}."
+    if not cursor.exhausted:
+        footer += (" More rows available: call dataflow_fetch_rows with "
+                   f"cursor_id='{cursor.id}'.")
+    return footer
@@ -1,6 +1,10 @@
-import requests
+import sys
+from pathlib import Path
 from mcp.server.fastmcp import FastMCP
 
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from open_meteo import get_client  # noqa: E402
+
 
 mcp = FastMCP("weather")
 
@@ -22,49 +26,37 @@ async def get_forecast(city_name: str) -> str:
             - The current wind speed (km/h).
             - The raw weather code (int).
     """
+    return await get_client().forecast(city_name)
 
-    geocode_url = "https://geocoding-api.open-meteo.com/v1/search"
-    geo_params = {"name": city_name,
-                  "count": 1,
-                  "language": "en",
-                  "format": "json"}
-
-    geo_response = requests.get(geocode_url, params=geo_params, timeout=10)
-    geo_data = geo_response.json()
-
-    if "results" not in geo_data or len(geo_data["results"]) == 0:
-        return f"City '{city_name}' not found."
 
-    location = geo_data["results"][0]
-    latitude = location["latitude"]
-    longitude = location["longitude"]
+@mcp.tool()
+async def get_forecasts(city_names: list[str]) -> str:
+    """
+    Fetches current weather information for several cities at once using
+    the Open-Meteo API. Use it instead of calling get_forecast repeatedly
+    when comparing cities.
 
-    weather_url = "https://api.open-meteo.com/v1/forecast"
-    weather_params = {
-        "latitude": latitude,
-        "longitude": longitude,
-        "current_weather": True,
-    }
+    Args:
+        city_names (list[str]): The names of the cities to query
+            (e.g., ["Madrid", "Paris", "Rome"]).
 
-    weather_response = requests.get(weather_url,
-                                    params=weather_params,
-                                    timeout=10)
-    weather_data = weather_response.json()
+    Returns:
+        str: A markdown table with one row per city containing the resolved
+            location and coordinates, the current temperature (°C), wind
+            speed (km/h) and raw weather code. Cities that could not be
+            found or fetched have an error instead.
+    """
+    return await get_client().forecast_many(city_names)
 
-    if "current_weather" not in weather_data:
-        return "Could not fetch current weather data."
 
-    current = weather_data["current_weather"]
-    temperature = current["temperature"]
-    windspeed = current["windspeed"]
-    weather_code = current["weathercode"]
+@mcp.tool()
+async def weather_cache_stats() -> str:
+    """
+    Report how many weather lookups were answered from the geocoding and
+    forecast caches and how many upstream requests were made.
+    """
+    return get_client().stats()
 
-    return (
-        f"Weather in {location['name']} ({latitude}, {longitude}):\n"
-        f"- Temperature: {temperature}°C\n"
-        f"- Wind speed: {windspeed} km/h\n"
-        f"- Weather code: {weather_code}"
-    )
 
 if __name__ == "__main__":
     # Initialize and run the server
@@ -0,0 +1,273 @@
+"""
+This file keeps one warm MCP session per configured server.
+
+MultiServerMCPClient.get_tools() returns tools that open a new session for
+every call, which for stdio servers means starting a new Python process
+per tool call. The SessionPool instead opens each session once, checks it
+with a ping every HEALTH_INTERVAL seconds and reconnects it with backoff
+when the server dies, so a tool call costs a single JSON-RPC round-trip.
+
+All servers are connected concurrently. Tool schemas come from the
+ToolCatalog on disk when it has them, so the tools are available before
+the handshakes finish, and are refreshed once the server is connected. A
+server that is not cached and does not connect within CONNECT_TIMEOUT is
+left out (degraded mode) instead of blocking the others, and is skipped
+without waiting by the starts that follow within FAILED_TTL seconds.
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import random
+import time
+from typing import Dict, List, Optional
+import anyio
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp import ClientSession
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED, CallToolResult, Tool
+from my_mcp.tool_cache import ToolCatalog
+
+
+logger = logging.getLogger(__name__)
+
+HEALTH_INTERVAL = float(os.environ.get("MCP_HEALTH_INTERVAL", 30))
+PING_TIMEOUT = float(os.environ.get("MCP_PING_TIMEOUT", 10))
+CONNECT_TIMEOUT = float(os.environ.get("MCP_CONNECT_TIMEOUT", 30))
+MAX_BACKOFF = 30.0
+# Failures of a reconnecting server are logged at most this often
+WARN_INTERVAL = float(os.environ.get("MCP_WARN_INTERVAL", 60))
+
+# Raised when the request could not even be sent: safe to retry
+SEND_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError)
+
+
+def connection_lost(error: BaseException) -> bool:
+    if isinstance(error, McpError):
+        return error.error.code == CONNECTION_CLOSED
+    return isinstance(error, SEND_ERRORS + (anyio.EndOfStream, OSError))
+
+
+class ServerSession:
+    """
+    The session of one server, owned by a background task: the MCP client
+    context managers must be entered and exited in the same task.
+
+    call_tool has the signature of ClientSession.call_tool, so the pool
+    can stand in for a session in the tools of langchain_mcp_adapters.
+    """
+
+    def __init__(self, client: MultiServerMCPClient, name: str):
+        self.client = client
+        self.name = name
+        self.session: Optional[ClientSession] = None
+        self.reconnects = 0
+        self._ready = asyncio.Event()
+        self._broken = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._failures = 0
+        self._last_warning = float("-inf")
+
+    def start(self):
+        self._task = asyncio.create_task(self._serve(),
+                                         name=f"mcp-session-{self.name}")
+
+    def _log_failure(self, message: str, *args):
+        """Warn about the first failure, then once per WARN_INTERVAL."""
+        self._failures += 1
+        now = time.monotonic()
+        if now - self._last_warning < WARN_INTERVAL:
+            logger.debug(message, self.name, *args)
+            return
+        if self._failures > 1:
+            message += " (%d failures since the last warning)"
+            args += (self._failures,)
+        logger.warning(message, self.name, *args)
+        self._last_warning = now
+        self._failures = 0
+
+    async def _serve(self):
+        backoff = 0.5
+        while not self._closing:
+            connected = None
+            try:
+                async with self.client.session(self.name) as session:
+                    connected = time.monotonic()
+                    self.session = session
+                    self._broken.clear()
+                    self._ready.set()
+                    await self._watch(session)
+            except Exception as e:
+                self._log_failure("MCP server '%s' failed: %r", e)
+            finally:
+                self._ready.clear()
+                self.session = None
+            if self._closing:
+                return
+            # A session that dies right after the handshake keeps backing off
+            if connected is not None and \
+                    time.monotonic() - connected > MAX_BACKOFF:
+                backoff = 0.5
+            self.reconnects += 1
+            await asyncio.sleep(backoff * random.uniform(0.5, 1))
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+    async def _watch(self, session: ClientSession):
+        """Return once the session is known to be broken."""
+        while True:
+            try:
+                await asyncio.wait_for(self._broken.wait(), HEALTH_INTERVAL)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await asyncio.wait_for(session.send_ping(), PING_TIMEOUT)
+            except Exception as e:
+                self._log_failure("MCP server '%s' did not answer a ping: "
+                                  "%r", e)
+                return
+
+    async def ready(self, timeout: float = CONNECT_TIMEOUT) -> ClientSession:
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionError(f"MCP server '{self.name}' is not "
+                                  f"connected after {timeout:g}s")
+        return self.session
+
+    async def list_tools(self) -> List[Tool]:
+        session = await self.ready()
+        tools, cursor = [], None
+        while True:
+            page = await session.list_tools(cursor=cursor)
+            tools += page.tools
+            cursor = page.nextCursor
+            if not cursor:
+                return tools
+
+    async def call_tool(self, name: str, arguments: dict,
+                        *args, **kwargs) -> CallToolResult:
+        for attempt in (1, 2):
+            session = await self.ready()
+            try:
+                return await session.call_tool(name, arguments,
+                                               *args, **kwargs)
+            except Exception as e:
+                if not connection_lost(e):
+                    raise
+                self._ready.clear()
+                self._broken.set()
+                # Only retry when the request never reached the server
+                if attempt == 2 or not isinstance(e, SEND_ERRORS):
+                    raise
+                await asyncio.sleep(0)
+
+    async def close(self):
+        self._closing = True
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+
+class SessionPool:
+    """
+    Persistent, health-checked sessions to every server of an mcp_config.
+
+    Usage:
+        async with SessionPool(mcp_config) as pool:
+            tools = await pool.get_tools()
+    """
+
+    def __init__(self, connections: dict,
+                 catalog: Optional[ToolCatalog] = None):
+        self.connections = connections
+        self.client = MultiServerMCPClient(connections=connections)
+        self.servers: Dict[str, ServerSession] = {
+            name: ServerSession(self.client, name) for name in connections}
+        self.catalog = catalog or ToolCatalog()
+        self.unavailable: List[str] = []
+        self._refreshes: List[asyncio.Task] = []
+
+    async def start(self):
+        """Start connecting to every server, without waiting for them."""
+        for server in self.servers.values():
+            server.start()
+
+    async def _refresh_catalog(self, server: ServerSession,
+                               cached: Optional[List[Tool]]):
+        connection = self.connections[server.name]
+        try:
+            tools = await server.list_tools()
+        except Exception as e:
+            if cached is None:
+                self.catalog.mark_failed(server.name, connection)
+            logger.warning("Could not refresh the tools of MCP server "
+                           "'%s': %r", server.name, e)
+            return
+        self.catalog.save(server.name, connection, tools)
+        if tools != cached:
+            logger.warning("The tools of MCP server '%s' changed, they are "
+                           "used from the next start", server.name)
+
+    async def _server_tools(self, server: ServerSession) -> List[Tool]:
+        connection = self.connections[server.name]
+        cached = self.catalog.load(server.name, connection)
+        if cached is not None:
+            self._refreshes.append(asyncio.create_task(
+                self._refresh_catalog(server, cached)))
+            return cached
+        if self.catalog.failed_recently(server.name, connection):
+            # Cache its tools in the background if it connects after all
+            self._refreshes.append(asyncio.create_task(
+                self._refresh_catalog(server, None)))
+            logger.warning("Continuing without MCP server '%s': it failed "
+                           "to connect recently", server.name)
+            self.unavailable.append(server.name)
+            return []
+        try:
+            tools = await server.list_tools()
+        except Exception as e:
+            self.catalog.mark_failed(server.name, connection)
+            logger.warning("Continuing without MCP server '%s': %r",
+                           server.name, e)
+            self.unavailable.append(server.name)
+            return []
+        self.catalog.save(server.name, connection, tools)
+        return tools
+
+    async def get_tools(self) -> List[BaseTool]:
+        """LangChain tools of all available servers, calling the pool."""
+        servers = list(self.servers.values())
+        catalogs = await asyncio.gather(*(self._server_tools(server)
+                                          for server in servers))
+        tools = []
+        for server, catalog in zip(servers, catalogs):
+            for tool in catalog:
+                tool = convert_mcp_tool_to_langchain_tool(server, tool)
+                # Used by the ToolExecutor for the per-server limits
+                tool.metadata = {**(tool.metadata or {}),
+                                 "mcp_server": server.name}
+                tools.append(tool)
+        return tools
+
+    async def close(self):
+        for task in self._refreshes:
+            task.cancel()
+        await asyncio.gather(*(server.close()
+                               for server in self.servers.values()))
+
+    async def __aenter__(self) -> "SessionPool":
+        try:
+            await self.start()
+        except BaseException:
+            await self.close()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
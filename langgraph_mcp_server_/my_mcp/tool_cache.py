@@ -0,0 +1,75 @@
+"""
+This file caches the tool schemas of each MCP server on disk.
+
+Entries are keyed by the server name and a hash of its resolved config
+(command, args, env, url, ...), so changing the config of a server, or the
+value of one of its environment variables, invalidates its entry. With a
+cached catalog the client can build the agent graph before the servers
+have finished starting.
+
+A server that could not be reached gets a short-lived negative entry
+instead, so the next starts do not wait for it again.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import List, Optional
+from mcp.types import Tool
+
+
+TOOL_CACHE_DIR = Path(os.environ.get(
+    "MCP_TOOL_CACHE_DIR", Path(__file__).parent / ".tool_cache"))
+FAILED_TTL = float(os.environ.get("MCP_FAILED_TTL", 300))
+
+
+def config_hash(connection: dict) -> str:
+    text = json.dumps(connection, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+class ToolCatalog:
+    def __init__(self, directory: Path = TOOL_CACHE_DIR):
+        self.directory = Path(directory)
+
+    def _file(self, name: str, connection: dict) -> Path:
+        return self.directory / f"{name}.{config_hash(connection)}.json"
+
+    def _failed_file(self, name: str, connection: dict) -> Path:
+        return self.directory / f"{name}.{config_hash(connection)}.failed"
+
+    def load(self, name: str, connection: dict) -> Optional[List[Tool]]:
+        try:
+            with open(self._file(name, connection), "r") as f:
+                return [Tool.model_validate(tool) for tool in json.load(f)]
+        except (OSError, ValueError):
+            return None
+
+    def save(self, name: str, connection: dict, tools: List[Tool]):
+        """Store the catalog, replacing older entries of the server."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._file(name, connection)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump([tool.model_dump(mode="json", exclude_none=True)
+                       for tool in tools], f)
+        os.replace(tmp_path, path)
+        for old in self.directory.glob(f"{name}.*.json"):
+            if old != path and old.stem.rsplit(".", 1)[0] == name:
+                old.unlink(missing_ok=True)
+        self._failed_file(name, connection).unlink(missing_ok=True)
+
+    def mark_failed(self, name: str, connection: dict):
+        """Remember that the server could not be reached just now."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._failed_file(name, connection).touch()
+
+    def failed_recently(self, name: str, connection: dict,
+                        ttl: float = FAILED_TTL) -> bool:
+        try:
+            mtime = self._failed_file(name, connection).stat().st_mtime
+        except OSError:
+            return False
+        return time.time() - mtime < ttl
@@ -0,0 +1,103 @@
+"""
+This file implements the node that runs the tool calls of the agent.
+
+All tool calls of an AIMessage start at once and their ToolMessages are
+returned in the order of the calls. Each call waits for a slot of its tool
+and then of its MCP server, so a slow tool only holds back the calls that
+share its limits, and is stopped after its timeout.
+
+Limits default to TOOL_CONCURRENCY calls per tool, TOOL_SERVER_CONCURRENCY
+calls per server and TOOL_CALL_TIMEOUT seconds per call. TOOL_LIMITS
+overrides them for single tools or servers with a JSON object such as:
+
+    {"tools": {"dataflow_query_data": {"concurrency": 1, "timeout": 300}},
+     "servers": {"weather": {"concurrency": 8}}}
+
+A tool's own timeout wins over its server's.
+
+The server of a tool is read from its `mcp_server` metadata (see
+SessionPool.get_tools); tools without one share the "local" server.
+"""
+
+import asyncio
+import json
+import os
+from typing import Dict, List, Optional
+from langchain_core.messages import AIMessage, ToolCall, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
+
+
+TOOL_CONCURRENCY = int(os.environ.get("TOOL_CONCURRENCY", 2))
+TOOL_SERVER_CONCURRENCY = int(os.environ.get("TOOL_SERVER_CONCURRENCY", 4))
+TOOL_CALL_TIMEOUT = float(os.environ.get("TOOL_CALL_TIMEOUT", 120))
+TOOL_LIMITS = json.loads(os.environ.get("TOOL_LIMITS", "{}"))
+LOCAL_SERVER = "local"
+
+
+def tool_server(tool: BaseTool) -> str:
+    return (tool.metadata or {}).get("mcp_server", LOCAL_SERVER)
+
+
+class ToolExecutor:
+    """
+    Graph node running the tool calls of the last AIMessage concurrently,
+    under per-tool and per-server concurrency limits and timeouts.
+
+    Usage:
+        builder.add_node("tools", ToolExecutor(tools))
+    """
+
+    def __init__(self, tools: List[BaseTool],
+                 limits: Optional[Dict[str, dict]] = None):
+        self.tools = {tool.name: tool for tool in tools}
+        self.limits = TOOL_LIMITS if limits is None else limits
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _limit(self, kind: str, name: str, key: str, default):
+        """The `key` limit of `name` in the "tools" or "servers" `kind`."""
+        return self.limits.get(kind, {}).get(name, {}).get(key, default)
+
+    def _semaphore(self, key: str, concurrency: int) -> asyncio.Semaphore:
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(concurrency)
+        return self._semaphores[key]
+
+    def _error(self, call: ToolCall, content: str) -> ToolMessage:
+        return ToolMessage(content=content, name=call["name"],
+                           tool_call_id=call["id"], status="error")
+
+    async def _run(self, call: ToolCall, config: RunnableConfig
+                   ) -> ToolMessage:
+        tool = self.tools.get(call["name"])
+        if tool is None:
+            return self._error(call, (
+                f"Error: {call['name']} is not a valid tool, try one of "
+                f"[{', '.join(self.tools)}]."))
+        server = tool_server(tool)
+        tool_slot = self._semaphore(f"tool:{tool.name}", self._limit(
+            "tools", tool.name, "concurrency", TOOL_CONCURRENCY))
+        server_slot = self._semaphore(f"server:{server}", self._limit(
+            "servers", server, "concurrency", TOOL_SERVER_CONCURRENCY))
+        timeout = self._limit("tools", tool.name, "timeout", self._limit(
+            "servers", server, "timeout", TOOL_CALL_TIMEOUT))
+        # Always tool first, then server, so calls cannot deadlock
+        async with tool_slot, server_slot:
+            try:
+                return await asyncio.wait_for(
+                    tool.ainvoke({**call, "type": "tool_call"}, config),
+                    timeout)
+            except asyncio.TimeoutError:
+                return self._error(call, (
+                    f"Error: {call['name']} timed out after "
+                    f"{timeout:g} seconds."))
+            except Exception as e:
+                return self._error(
+                    call, f"Error: {e!r}\n Please fix your mistakes.")
+
+    async def __call__(self, state, config: RunnableConfig) -> dict:
+        message = next(message for message in reversed(state.messages)
+                       if isinstance(message, AIMessage))
+        results = await asyncio.gather(*(self._run(call, config)
+                                         for call in message.tool_calls))
+        return {"messages": list(results)}
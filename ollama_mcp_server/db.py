@@ -0,0 +1,439 @@
+"""
+SQLite access for the sqlite-damian MCP server.
+
+The schema is created once when the pool is built and connections are
+reused between tool calls instead of being opened for every call. The
+database runs in WAL mode, so readers are not blocked by a writer.
+
+Every statement runs within budgets: a wall-clock timeout enforced by a
+SQLite progress handler, a cap on the rows one query may return across
+all its pages and a ceiling on the memory SQLite may allocate.
+"""
+
+import asyncio
+import base64
+import csv
+import functools
+import hashlib
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+
+DB_PATH = os.environ.get("SQLITE_DB_PATH", "demo.db")
+POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", 4))
+INSERT_BATCH_ROWS = 1000
+MAX_REPORTED_REJECTS = 20
+PEOPLE_FIELDS = ("name", "age", "profession")
+MIN_AGE, MAX_AGE = 0, 150
+DEFAULT_READ_ROWS = 100
+MAX_READ_ROWS = int(os.environ.get("SQLITE_MAX_READ_ROWS", 500))
+MAX_RESULT_ROWS = int(os.environ.get("SQLITE_MAX_RESULT_ROWS", 10_000))
+QUERY_TIMEOUT = float(os.environ.get("SQLITE_QUERY_TIMEOUT", 30))
+# Process-wide limit of SQLite's heap, page caches included
+MEMORY_LIMIT = int(os.environ.get("SQLITE_MEMORY_LIMIT", 512 * 1024 ** 2))
+PROGRESS_STEPS = 10_000   # VM instructions between deadline checks
+# Queries paged by keyset: a plain SELECT of the people table, optionally
+# aliased and filtered, so that its id column is the primary key
+PEOPLE_SELECT = re.compile(
+    r"^select\s+(?P<columns>.+?)\s+from\s+people"
+    r"(?:\s+(?:as\s+)?(?P<alias>\w+))?(?:\s+where\s+(?P<where>.*))?$",
+    re.IGNORECASE | re.DOTALL)
+NOT_KEYSET = re.compile(
+    r"\b(?:select|distinct|join|group\s+by|order\s+by|limit|union|"
+    r"intersect|except|window)\b", re.IGNORECASE)
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS people (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        age INTEGER NOT NULL,
+        profession TEXT NOT NULL
+    )
+'''
+
+INSERT_PERSON = \
+    "INSERT INTO people (name, age, profession) VALUES (?, ?, ?)"
+
+# Applied to every connection. NORMAL is durable enough with WAL (only the
+# last transactions can be lost on power failure, never corrupted).
+PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",      # 16 MiB page cache per connection
+    "PRAGMA mmap_size = 268435456",    # memory-map up to 256 MiB
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def execute_write(conn: sqlite3.Connection, query: str):
+    conn.execute(query)
+    conn.commit()
+
+
+def init_db(path: str):
+    """Create the schema and switch the database to WAL mode, once."""
+    conn = connect(path)
+    try:
+        conn.execute(f"PRAGMA hard_heap_limit = {int(MEMORY_LIMIT)}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(SCHEMA)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+def describe_error(e: BaseException) -> str:
+    if isinstance(e, QueryTimeout):
+        return f"cancelled after exceeding the {QUERY_TIMEOUT:g}s timeout"
+    if isinstance(e, MemoryError):
+        return ("cancelled after exceeding the SQLite memory limit of "
+                f"{MEMORY_LIMIT} bytes")
+    return str(e)
+
+
+@dataclass
+class AbortStats:
+    """Number of statements stopped by each budget."""
+    timeout: int = 0
+    cancelled: int = 0
+    rows: int = 0
+    memory: int = 0
+
+    def as_dict(self) -> dict:
+        return {field.name: getattr(self, field.name)
+                for field in fields(self)}
+
+
+class ConnectionPool:
+    """
+    Reusable connections to one database, used from worker threads so the
+    event loop never blocks on SQLite.
+
+    Reads run on up to `size` read-only connections in parallel. All
+    writes go through a single writer connection on a dedicated thread,
+    so they are serialized in the order they were submitted instead of
+    contending for SQLite's write lock; thanks to WAL they do not block
+    the readers.
+
+    A statement still running `timeout` seconds after its call started, or
+    whose awaiting task was cancelled, is interrupted by the progress
+    handler. Aborts are counted in `aborts`.
+    """
+
+    def __init__(self, path: str = DB_PATH, size: int = POOL_SIZE):
+        self.path = path
+        self.size = size
+        init_db(path)
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._writer = connect(path)
+        self._read_executor = ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix="sqlite-read")
+        self._write_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="sqlite-write")
+        self.aborts = AbortStats()
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                conn = connect(self.path)
+                conn.execute("PRAGMA query_only = ON")
+                return conn
+        return self._idle.get()
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            # Never hand out a connection with a transaction left open
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def _guarded(self, conn: sqlite3.Connection, deadline: Optional[float],
+                 cancelled: threading.Event, fn: Callable, *args):
+        """Worker: run `fn(conn, *args)` within the time budget."""
+        def progress() -> int:
+            expired = deadline is not None and time.monotonic() > deadline
+            return int(expired or cancelled.is_set())
+
+        conn.set_progress_handler(progress, PROGRESS_STEPS)
+        try:
+            return fn(conn, *args)
+        except sqlite3.OperationalError as e:
+            if str(e) != "interrupted":
+                raise
+            if cancelled.is_set():
+                self.aborts.cancelled += 1
+                raise
+            self.aborts.timeout += 1
+            raise QueryTimeout() from e
+        except MemoryError:
+            self.aborts.memory += 1
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+            if conn.in_transaction:
+                conn.rollback()
+
+    def _read(self, *args):
+        with self.reader() as conn:
+            return self._guarded(conn, *args)
+
+    def _write(self, *args):
+        return self._guarded(self._writer, *args)
+
+    async def _submit(self, executor: ThreadPoolExecutor, work: Callable,
+                      timeout: Optional[float], fn: Callable, *args):
+        # The deadline counts from submission, time spent queued included
+        deadline = time.monotonic() + timeout if timeout else None
+        cancelled = threading.Event()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor, functools.partial(
+            work, deadline, cancelled, fn, *args))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def read(self, fn: Callable, *args,
+                   timeout: Optional[float] = QUERY_TIMEOUT):
+        """
+        Run `fn(conn, *args)` on a read-only connection. Raises
+        QueryTimeout once `timeout` seconds have passed.
+        """
+        return await self._submit(self._read_executor, self._read,
+                                  timeout, fn, *args)
+
+    async def write(self, fn: Callable, *args,
+                    timeout: Optional[float] = QUERY_TIMEOUT):
+        """
+        Run `fn(conn, *args)` on the writer connection, after the writes
+        submitted before it. `fn` must commit; whatever it leaves
+        uncommitted is rolled back. Raises QueryTimeout once `timeout`
+        seconds have passed, None disables the timeout.
+        """
+        return await self._submit(self._write_executor, self._write,
+                                  timeout, fn, *args)
+
+    def close(self):
+        self._write_executor.shutdown()
+        self._read_executor.shutdown()
+        self._writer.close()
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def person_row(record) -> Tuple[str, int, str]:
+    """Validate one people record and return it as an INSERT row."""
+    if not isinstance(record, dict):
+        raise ValueError("record must be an object with name, age and "
+                         "profession")
+    # Blank text counts as missing, it would be stored as ''
+    missing = [field for field in PEOPLE_FIELDS
+               if record.get(field) is None or
+               (isinstance(record[field], str) and not record[field].strip())]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    name, age, profession = (record[field] for field in PEOPLE_FIELDS)
+    if not isinstance(name, str) or not isinstance(profession, str):
+        raise ValueError("name and profession must be text")
+    try:
+        # Accept "30" from CSV files, but not 30.5 or True
+        if isinstance(age, bool) or int(age) != float(age):
+            raise ValueError
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"age must be an integer, got {age!r}")
+    age = int(age)
+    if not MIN_AGE <= age <= MAX_AGE:
+        raise ValueError(f"age must be between {MIN_AGE} and {MAX_AGE}, "
+                         f"got {age}")
+    return name.strip(), age, profession.strip()
+
+
+def read_records(file_path: str) -> Iterator[dict]:
+    """Records of a .csv, .json (array) or .jsonl file, one at a time."""
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in (".csv", ".json", ".jsonl"):
+        raise ValueError(f"unsupported file type '{extension}', "
+                         "use .csv, .json or .jsonl")
+    with open(file_path, "r", encoding="utf-8", newline="") as f:
+        if extension == ".csv":
+            yield from csv.DictReader(f)
+        elif extension == ".jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            records = json.load(f)
+            if not isinstance(records, list):
+                raise ValueError("a JSON file must hold an array of records")
+            yield from records
+
+
+def insert_people(conn: sqlite3.Connection, records: Iterable,
+                  batch_rows: int = INSERT_BATCH_ROWS) -> dict:
+    """
+    Insert valid records with executemany, `batch_rows` at a time, in a
+    single transaction: either all valid records are inserted or, if
+    SQLite or reading the records fails, none are. Invalid records are
+    skipped and reported.
+    """
+    inserted = 0
+    rejected = []
+    rejected_count = 0
+    batch = []
+    try:
+        for number, record in enumerate(records, start=1):
+            try:
+                batch.append(person_row(record))
+            except ValueError as e:
+                rejected_count += 1
+                if len(rejected) < MAX_REPORTED_REJECTS:
+                    rejected.append({"record": number, "error": str(e)})
+                continue
+            if len(batch) >= batch_rows:
+                conn.executemany(INSERT_PERSON, batch)
+                inserted += len(batch)
+                batch = []
+        if batch:
+            conn.executemany(INSERT_PERSON, batch)
+            inserted += len(batch)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return {"inserted": inserted, "rejected": rejected_count,
+            "rejected_records": rejected}
+
+
+def _query_digest(query: str) -> str:
+    return hashlib.sha256(" ".join(query.split()).encode()).hexdigest()[:16]
+
+
+def encode_page_token(query: str, position: dict) -> str:
+    token = json.dumps({"query": _query_digest(query), **position})
+    return base64.urlsafe_b64encode(token.encode()).decode("ascii")
+
+
+def decode_page_token(query: str, token: str) -> dict:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except ValueError:
+        raise ValueError("invalid page token")
+    if not isinstance(position, dict) or \
+            position.pop("query", None) != _query_digest(query):
+        raise ValueError("the page token belongs to a different query")
+    return position
+
+
+def _keyset_pageable(query: str, columns: list) -> bool:
+    """True if the `id` column of the result is the people primary key."""
+    match = PEOPLE_SELECT.match(query)
+    if match is None or columns.count("id") != 1:
+        return False
+    if NOT_KEYSET.search(match["columns"]) or \
+            NOT_KEYSET.search(match["where"] or ""):
+        return False
+    names = {"*", "id", "people.*", "people.id"}
+    if match["alias"]:
+        names |= {f"{match['alias']}.*", f"{match['alias']}.id"}
+    return any(item.strip().lower() in names
+               for item in match["columns"].split(","))
+
+
+def read_page(conn: sqlite3.Connection, query: str, limit: int,
+              page_token: Optional[str] = None, log=None) -> dict:
+    """
+    One page of at most `limit` rows (capped at MAX_READ_ROWS) of `query`.
+    A query returns at most MAX_RESULT_ROWS rows over all its pages; the
+    page reaching that budget has `truncated` set and no next page.
+
+    Plain SELECTs of the people table that return its id and have no
+    ORDER BY of their own are paged by keyset (`id > last id`), so every
+    page costs the same whatever its depth. Other SELECTs (joins,
+    aggregates, subqueries...) are paged by offset, in their own order.
+    Only the page itself is fetched from SQLite; `next_page_token`
+    continues after it and is None on the last page. SELECTs are
+    recorded in the QueryLog `log`, if given.
+    """
+    query = query.strip().rstrip(";")
+    position = decode_page_token(query, page_token) if page_token else {}
+    read = position.get("read", 0)
+    limit = max(1, min(limit, MAX_READ_ROWS, MAX_RESULT_ROWS - read))
+
+    try:
+        probe = conn.execute(f"SELECT * FROM ({query}) LIMIT 0")
+        columns = [column[0] for column in probe.description]
+    except sqlite3.Error:
+        # Not a SELECT (e.g. PRAGMA): cap the rows, there is no next page
+        if page_token:
+            raise ValueError("this query cannot be paged")
+        cursor = conn.execute(query)
+        columns = [column[0] for column in cursor.description or ()]
+        rows = cursor.fetchmany(limit + 1)
+        return {"columns": columns, "rows": rows[:limit],
+                "next_page_token": None, "truncated": len(rows) > limit}
+
+    started = time.perf_counter()
+    keyset = _keyset_pageable(query, columns)
+    if keyset:
+        cursor = conn.execute(
+            f"SELECT * FROM ({query}) WHERE id > ? ORDER BY id LIMIT ?",
+            (position.get("after_id", float("-inf")), limit + 1))
+    else:
+        offset = position.get("offset", 0)
+        cursor = conn.execute(f"SELECT * FROM ({query}) LIMIT ? OFFSET ?",
+                              (limit + 1, offset))
+    rows = cursor.fetchall()
+    cursor.close()
+    if log is not None:
+        log.record(conn, query, time.perf_counter() - started)
+
+    next_page_token = None
+    truncated = False
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if read + limit >= MAX_RESULT_ROWS:
+            truncated = True
+        else:
+            if keyset:
+                next_position = {"after_id": rows[-1][columns.index("id")]}
+            else:
+                next_position = {"offset": offset + limit}
+            next_position["read"] = read + limit
+            next_page_token = encode_page_token(query, next_position)
+    return {"columns": columns, "rows": rows,
+            "next_page_token": next_page_token, "truncated": truncated}
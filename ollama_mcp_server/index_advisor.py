@@ -0,0 +1,273 @@
+"""
+Query log and index advisor for the sqlite-damian MCP server.
+
+Every query read_data runs is recorded with its timing and its
+EXPLAIN QUERY PLAN. Queries whose plan scans a whole table while filtering
+on some of its columns are grouped by table and filter columns; a group
+seen often enough becomes an index recommendation, which can also be
+created and measured before and after.
+"""
+
+import os
+import re
+import sqlite3
+import statistics
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+
+MAX_LOGGED_QUERIES = 500
+MIN_SCANS = int(os.environ.get("SQLITE_ADVISOR_MIN_SCANS", 2))
+TIMING_RUNS = 3
+
+SCAN = re.compile(r"^SCAN (\w+)$")
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+TABLE_ALIAS = re.compile(r"\b(?:from|join)\s+(\w+)(?:\s+(?:as\s+)?(\w+))?",
+                         re.IGNORECASE)
+WHERE = re.compile(r"\bwhere\b(.*?)(?=\b(?:group\s+by|order\s+by|limit|"
+                   r"window|union|intersect|except)\b|\)|$)",
+                   re.IGNORECASE | re.DOTALL)
+# Operators an index can serve; != and <> cannot use one
+EQUALITY = r"(?:==|=|\bin\b|\bis\b(?!\s+not\b))"
+RANGE = r"(?:<=|>=|<|>|\bbetween\b)"
+SQL_KEYWORDS = {"where", "on", "group", "order", "limit", "join", "left",
+                "inner", "cross", "natural", "using", "union"}
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.strip().rstrip(";").split())
+
+
+@dataclass
+class LoggedQuery:
+    query: str
+    plan: List[str]
+    executions: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    last_run: float = field(default_factory=time.time)
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.executions if self.executions else 0.0
+
+    def full_scans(self) -> List[str]:
+        """Names (or aliases) of the tables the plan scans completely."""
+        return [match.group(1) for match in map(SCAN.match, self.plan)
+                if match]
+
+
+class QueryLog:
+    """
+    Per-query execution counts, timings and plans of the last
+    MAX_LOGGED_QUERIES distinct queries. Plans are taken once per query
+    and taken again after the indexes change.
+    """
+
+    def __init__(self, max_entries: int = MAX_LOGGED_QUERIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, LoggedQuery] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, conn: sqlite3.Connection, query: str,
+               duration: float):
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry.plan is None:
+            entry = entry or LoggedQuery(query=key, plan=None)
+            try:
+                entry.plan = explain(conn, key)
+            except sqlite3.Error:
+                return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            entry.executions += 1
+            entry.total_ms += duration * 1000
+            entry.max_ms = max(entry.max_ms, duration * 1000)
+            entry.last_run = time.time()
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def entries(self) -> List[LoggedQuery]:
+        with self._lock:
+            return list(self._entries.values())
+
+    def forget_plans(self):
+        """Plans are stale once an index is created or dropped."""
+        with self._lock:
+            for entry in self._entries.values():
+                entry.plan = None
+
+    def report(self, top: int) -> List[dict]:
+        entries = sorted(self.entries(), key=lambda e: e.total_ms,
+                         reverse=True)
+        return [{"query": entry.query, "executions": entry.executions,
+                 "avg_ms": round(entry.avg_ms, 3),
+                 "max_ms": round(entry.max_ms, 3),
+                 "plan": entry.plan or []}
+                for entry in entries[:top]]
+
+
+def explain(conn: sqlite3.Connection, query: str) -> List[str]:
+    return [row[3] for row in
+            conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()]
+
+
+def filter_columns(query: str, table: str, alias: str,
+                   columns: List[str]) -> List[str]:
+    """
+    Index key for the WHERE filters of `query` on `table`: columns
+    compared for equality first, then at most one column compared by
+    range, as SQLite can only use the index past the first range.
+    """
+    text = STRING_LITERAL.sub("''", query)
+    names = {table.lower(), alias.lower()}
+    equality, ranges = [], []
+    for where in WHERE.finditer(text):
+        for column in columns:
+            if column.lower() == "id":
+                continue   # the rowid is already indexed
+            for qualifier in [None, *names]:
+                name = re.escape(column) if qualifier is None else \
+                    re.escape(qualifier) + r"\." + re.escape(column)
+                target = r"(?<![\w.])" + name + r"\s*"
+                if re.search(target + EQUALITY, where.group(1),
+                             re.IGNORECASE):
+                    equality.append(column)
+                elif re.search(target + RANGE, where.group(1),
+                               re.IGNORECASE):
+                    ranges.append(column)
+    key = list(dict.fromkeys(equality))
+    key += [column for column in ranges if column not in key][:1]
+    return key
+
+
+def _resolve_table(conn: sqlite3.Connection, query: str,
+                   scanned: str) -> Optional[str]:
+    """Table name behind `scanned`, which may be an alias."""
+    tables = {row[0].lower(): row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if scanned.lower() in tables:
+        return tables[scanned.lower()]
+    for table, alias in TABLE_ALIAS.findall(query):
+        if alias.lower() == scanned.lower() and table.lower() in tables:
+            return tables[table.lower()]
+    return None
+
+
+def _indexed_prefixes(conn: sqlite3.Connection,
+                      table: str) -> List[Tuple[str, ...]]:
+    prefixes = []
+    for index in conn.execute(f"PRAGMA index_list({quote(table)})"):
+        columns = conn.execute(
+            f"PRAGMA index_info({quote(index[1])})").fetchall()
+        prefixes.append(tuple((column[2] or "").lower()
+                              for column in sorted(columns)))
+    return prefixes
+
+
+def quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def recommend_indexes(conn: sqlite3.Connection, log: QueryLog,
+                      min_scans: int = MIN_SCANS) -> List[dict]:
+    """
+    Indexes that would replace full scans seen at least `min_scans` times,
+    most expensive first. Keys already served by an existing index (as its
+    leading columns) are not recommended.
+    """
+    candidates: Dict[Tuple[str, Tuple[str, ...]], dict] = {}
+    for entry in log.entries():
+        if entry.plan is None:
+            entry.plan = explain(conn, entry.query)
+        for scanned in entry.full_scans():
+            table = _resolve_table(conn, entry.query, scanned)
+            if table is None:
+                continue
+            columns = [row[1] for row in
+                       conn.execute(f"PRAGMA table_info({quote(table)})")]
+            key = filter_columns(entry.query, table, scanned, columns)
+            if not key:
+                continue
+            candidate = candidates.setdefault((table, tuple(key)), {
+                "table": table, "columns": key, "queries": [],
+                "scans": 0, "total_ms": 0.0})
+            candidate["queries"].append(entry)
+            candidate["scans"] += entry.executions
+            candidate["total_ms"] += entry.total_ms
+
+    recommendations = []
+    for (table, key), candidate in candidates.items():
+        if candidate["scans"] < min_scans:
+            continue
+        lowered = tuple(column.lower() for column in key)
+        if any(prefix[:len(lowered)] == lowered
+               for prefix in _indexed_prefixes(conn, table)):
+            continue
+        name = "idx_" + "_".join([table, *key]).lower()
+        slowest = max(candidate["queries"], key=lambda e: e.total_ms)
+        recommendations.append({
+            "index": name,
+            "table": table,
+            "sql": f"CREATE INDEX IF NOT EXISTS {quote(name)} ON "
+                   f"{quote(table)} ({', '.join(map(quote, key))})",
+            "scans": candidate["scans"],
+            "total_ms": round(candidate["total_ms"], 3),
+            "example_query": slowest.query,
+        })
+    recommendations.sort(key=lambda r: r["total_ms"], reverse=True)
+    return recommendations
+
+
+def time_query(conn: sqlite3.Connection, query: str,
+               runs: int = TIMING_RUNS) -> float:
+    """Median wall time in ms to run `query` and step through its rows."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        for _ in conn.execute(query):
+            pass
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def create_index(conn: sqlite3.Connection, log: QueryLog,
+                 recommendation: dict) -> dict:
+    """
+    Create a recommended index, gather its statistics with ANALYZE and
+    time its example query before and after. An index that makes the
+    query slower (e.g. on a filter matching most rows) is dropped again.
+    Adds 'before_ms', 'after_ms', 'kept' and the resulting 'plan'.
+
+    Meant to run under the caller's time budget (a progress handler on
+    `conn`): when it interrupts the work, the index is dropped again so
+    no unmeasured index is left behind, and the error is re-raised.
+    """
+    query = recommendation["example_query"]
+    before = time_query(conn, query)
+    try:
+        conn.execute(recommendation["sql"])
+        conn.execute(f"ANALYZE {quote(recommendation['index'])}")
+        conn.commit()
+        after = time_query(conn, query)
+    except sqlite3.OperationalError:
+        # The budget handler would interrupt the DROP as well
+        conn.set_progress_handler(None, 0)
+        conn.rollback()
+        conn.execute(f"DROP INDEX IF EXISTS {quote(recommendation['index'])}")
+        conn.commit()
+        raise
+    kept = after < before
+    if not kept:
+        conn.execute(f"DROP INDEX {quote(recommendation['index'])}")
+        conn.commit()
+    log.forget_plans()
+    return {**recommendation, "before_ms": round(before, 3),
+            "after_ms": round(after, 3), "kept": kept,
+            "plan": explain(conn, query)}
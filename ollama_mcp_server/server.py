@@ -1,28 +1,27 @@
 import argparse
+import atexit
 import sqlite3
-import requests
+import sys
+from pathlib import Path
+from typing import List, Optional
 from mcp.server.fastmcp import FastMCP
+from db import (ConnectionPool, DEFAULT_READ_ROWS, MAX_RESULT_ROWS,
+                MEMORY_LIMIT, QUERY_TIMEOUT, QueryTimeout, describe_error,
+                execute_write, insert_people, read_page, read_records)
+from index_advisor import QueryLog, create_index, recommend_indexes
 
-mcp = FastMCP('sqlite-damian')
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from open_meteo import get_client  # noqa: E402
 
+mcp = FastMCP('sqlite-damian')
 
-def init_db():
-    conn = sqlite3.connect('demo.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS people (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            age INTEGER NOT NULL,
-            profession TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    return conn, cursor
+pool = ConnectionPool()
+atexit.register(pool.close)
+query_log = QueryLog()
 
 
 @mcp.tool()
-def add_data(query: str) -> bool:
+async def add_data(query: str) -> bool:
     """
     Add new data to the people table using a SQL INSERT query.
 
@@ -45,25 +44,65 @@ def add_data(query: str) -> bool:
         ... INSERT INTO people (name, age, profession)
         ... VALUES ('Alice Smith', 25, 'Developer')
         ... '''
-        >>> add_data(query)
+        >>> await add_data(query)
         True
     """
-    conn, cursor = init_db()
     try:
-        cursor.execute(query)
-        conn.commit()
+        await pool.write(execute_write, query)
         return True
-    except sqlite3.Error as e:
-        print(f"Error adding data: {e}")
+    except (QueryTimeout, MemoryError, sqlite3.Error) as e:
+        print(f"Error adding data: {describe_error(e)}")
         return False
-    finally:
-        conn.close()
 
 
 @mcp.tool()
-def read_data(query: str = "SELECT * FROM people") -> list:
+async def add_people(people: Optional[List[dict]] = None,
+                     file_path: Optional[str] = None) -> dict:
     """
-    Read data from the people table using a SQL SELECT query.
+    Add many people to the people table in one call.
+
+    Pass the records directly or the path of a file holding them. Valid
+    records are inserted in a single transaction; invalid ones are skipped
+    and reported.
+
+    Args:
+        people (list[dict], optional): Records with the keys
+            name (text), age (integer) and profession (text).
+        file_path (str, optional): A .csv file with a header row
+            name,age,profession, a .json file with an array of records or
+            a .jsonl file with one record per line.
+
+    Returns:
+        dict: 'inserted' (number of rows added), 'rejected' (number of
+            invalid records) and 'rejected_records' (record number and
+            reason of the first rejected records).
+
+    Example:
+        >>> await add_people([{"name": "Alice Smith", "age": 25,
+        ...                     "profession": "Developer"},
+        ...                    {"name": "Bob", "age": "old",
+        ...                     "profession": "Chef"}])
+        {'inserted': 1, 'rejected': 1, 'rejected_records': [{'record': 2,
+         'error': "age must be an integer, got 'old'"}]}
+    """
+    if (people is None) == (file_path is None):
+        return {"error": "Pass either people or file_path."}
+    records = people if people is not None else read_records(file_path)
+    try:
+        # Bulk loads are only bounded by memory, not by the query timeout
+        return await pool.write(insert_people, records, timeout=None)
+    except (OSError, ValueError, MemoryError, sqlite3.Error) as e:
+        print(f"Error adding people: {describe_error(e)}")
+        return {"error": f"Error adding people: {describe_error(e)}"}
+
+
+@mcp.tool()
+async def read_data(query: str = "SELECT * FROM people",
+                    limit: int = DEFAULT_READ_ROWS,
+                    page_token: Optional[str] = None) -> dict:
+    """
+    Read data from the people table using a SQL SELECT query, one page at
+    a time.
 
     Args:
         query (str, optional): SQL SELECT query. Defaults to:
@@ -72,33 +111,136 @@ def read_data(query: str = "SELECT * FROM people") -> list:
             - "SELECT * FROM people"
             - "SELECT name, age FROM people WHERE age > 25"
             - "SELECT * FROM people ORDER BY age DESC"
+        limit (int, optional): Maximum number of rows to return. Defaults
+            to 100; the server caps it at SQLITE_MAX_READ_ROWS (500).
+            A query returns at most SQLITE_MAX_RESULT_ROWS (10000) rows
+            over all its pages and is stopped after SQLITE_QUERY_TIMEOUT
+            (30) seconds.
+        page_token (str, optional): The next_page_token of the previous
+            page, to continue reading the same query.
 
     Returns:
-        list: List of tuples containing the query results.
-              For default query, tuple format is (id, name, age, profession)
+        dict: 'columns' (column names), 'rows' (list of row tuples),
+            'next_page_token' (pass it back to get the next page, None on
+            the last page) and 'truncated' (True when the row budget was
+            reached before the end of the result). Results with an id
+            column and no ORDER BY are returned in id order.
 
     Example:
-        >>> # Read all records
-        >>> read_data()
-        [(1, 'John Doe', 30, 'Engineer'), (2, 'Alice Smith', 25, 'Developer')]
+        >>> # Read the first records
+        >>> await read_data(limit=2)
+        {'columns': ['id', 'name', 'age', 'profession'],
+         'rows': [(1, 'John Doe', 30, 'Engineer'),
+                  (2, 'Alice Smith', 25, 'Developer')],
+         'next_page_token': 'eyJxdWVyeSI6...', 'truncated': False}
 
         >>> # Read with custom query
-        >>> read_data("SELECT name, profession FROM people WHERE age < 30")
-        [('Alice Smith', 'Developer')]
+        >>> await read_data(
+        ...     "SELECT name, profession FROM people WHERE age < 30")
+        {'columns': ['name', 'profession'],
+         'rows': [('Alice Smith', 'Developer')], 'next_page_token': None,
+         'truncated': False}
+    """
+    try:
+        page = await pool.read(read_page, query, limit, page_token,
+                               query_log)
+    except (QueryTimeout, MemoryError, ValueError, sqlite3.Error) as e:
+        print(f"Error reading data: {describe_error(e)}")
+        return {"error": f"Error reading data: {describe_error(e)}"}
+    if page["truncated"]:
+        pool.aborts.rows += 1
+    return page
+
+
+@mcp.tool()
+def query_stats(top: int = 10) -> list:
+    """
+    Show the queries read_data ran that took the most time in total.
+
+    Args:
+        top (int, optional): Number of queries to show. Defaults to 10.
+
+    Returns:
+        list: One dict per query with the query text, number of
+            executions, average and maximum time in milliseconds and its
+            EXPLAIN QUERY PLAN lines.
+    """
+    return query_log.report(top)
+
+
+@mcp.tool()
+def query_budgets() -> dict:
+    """
+    Show the limits every SQL statement runs under and how many
+    statements were stopped by each of them.
+
+    Returns:
+        dict: 'budgets' (timeout in seconds, maximum rows per query and
+            SQLite memory limit in bytes) and 'aborted' (statements
+            stopped by the timeout, by client cancellation, by the row
+            budget and by the memory limit).
+    """
+    return {"budgets": {"timeout_seconds": QUERY_TIMEOUT,
+                        "max_result_rows": MAX_RESULT_ROWS,
+                        "memory_limit_bytes": MEMORY_LIMIT},
+            "aborted": pool.aborts.as_dict()}
+
+
+@mcp.tool()
+async def advise_indexes(create: bool = False) -> dict:
+    """
+    Recommend indexes for filters that repeatedly made read_data scan a
+    whole table, and optionally create them.
+
+    Args:
+        create (bool, optional): Create the recommended indexes one by
+            one and time the slowest matching query before and after,
+            each within the query timeout. Recommendations are computed
+            again after every index, so keys an earlier index already
+            covers are skipped. Defaults to False (only recommend).
+
+    Returns:
+        dict: 'recommendations', each with the index name, the CREATE
+            INDEX statement, the number of scans it would avoid, their
+            total time in ms and an example query. With create=True each
+            also has 'before_ms', 'after_ms', the new query 'plan' and
+            'kept', False when the index did not make the query faster
+            and was dropped again. If an index runs out of time, it is
+            dropped, no further index is created and 'error' says why.
+
+    Example:
+        >>> await advise_indexes()
+        {'recommendations': [{'index': 'idx_people_age',
+          'sql': 'CREATE INDEX IF NOT EXISTS "idx_people_age" ON "people"
+                  ("age")', 'scans': 4, 'total_ms': 12.5,
+          'example_query': 'SELECT * FROM people WHERE age > 60'}]}
     """
-    conn, cursor = init_db()
     try:
-        cursor.execute(query)
-        return cursor.fetchall()
-    except sqlite3.Error as e:
-        print(f"Error reading data: {e}")
-        return []
-    finally:
-        conn.close()
+        recommendations = await pool.read(recommend_indexes, query_log)
+        if not create:
+            return {"recommendations": recommendations}
+        created, tried = [], set()
+        while True:
+            pending = [recommendation for recommendation in recommendations
+                       if recommendation["index"] not in tried]
+            if not pending:
+                return {"recommendations": created}
+            tried.add(pending[0]["index"])
+            try:
+                created.append(await pool.write(create_index, query_log,
+                                                pending[0]))
+            except QueryTimeout as e:
+                return {"recommendations": created, "error": (
+                    f"Error creating {pending[0]['index']}: "
+                    f"{describe_error(e)}")}
+            recommendations = await pool.read(recommend_indexes, query_log)
+    except (QueryTimeout, MemoryError, sqlite3.Error) as e:
+        print(f"Error advising indexes: {describe_error(e)}")
+        return {"error": f"Error advising indexes: {describe_error(e)}"}
 
 
 @mcp.tool()
-def get_weather(city_name) -> str:
+async def get_weather(city_name: str) -> str:
     """
     Fetches current weather information for a given city using the Open-Meteo
     API. In order to get the information the longitude and latitude of the city
@@ -116,50 +258,18 @@ def get_weather(city_name) -> str:
 
     Example:
         >>> # Get the weather in Madrid
-        >>> get_weather("Madrid")
-    """
-    geocode_url = "https://geocoding-api.open-meteo.com/v1/search"
-    geo_params = {"name": city_name,
-                  "count": 1,
-                  "language": "en",
-                  "format": "json"}
-
-    geo_response = requests.get(geocode_url, params=geo_params, timeout=10)
-    geo_data = geo_response.json()
-
-    if "results" not in geo_data or len(geo_data["results"]) == 0:
-        return f"City '{city_name}' not found."
-
-    location = geo_data["results"][0]
-    latitude = location["latitude"]
-    longitude = location["longitude"]
-
-    weather_url = "https://api.open-meteo.com/v1/forecast"
-    weather_params = {
-        "latitude": latitude,
-        "longitude": longitude,
-        "current_weather": True,
-    }
-
-    weather_response = requests.get(weather_url,
-                                    params=weather_params,
-                                    timeout=10)
-    weather_data = weather_response.json()
-
-    if "current_weather" not in weather_data:
-        return "Could not fetch current weather data."
-
-    current = weather_data["current_weather"]
-    temperature = current["temperature"]
-    windspeed = current["windspeed"]
-    weather_code = current["weathercode"]
-
-    return (
-        f"Weather in {location['name']} ({latitude}, {longitude}):\n"
-        f"- Temperature: {temperature}°C\n"
-        f"- Wind speed: {windspeed} km/h\n"
-        f"- Weather code: {weather_code}"
-    )
+        >>> await get_weather("Madrid")
+    """
+    return await get_client().forecast(city_name)
+
+
+@mcp.tool()
+async def weather_cache_stats() -> str:
+    """
+    Report how many weather lookups were answered from the geocoding and
+    forecast caches and how many upstream requests were made.
+    """
+    return get_client().stats()
 
 
 if __name__ == "__main__":
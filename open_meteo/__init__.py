@@ -0,0 +1,7 @@
+"""
+Shared Open-Meteo client used by the weather MCP servers of this repository.
+"""
+
+from .client import OpenMeteoClient, format_current_weather, get_client
+
+__all__ = ["OpenMeteoClient", "format_current_weather", "get_client"]
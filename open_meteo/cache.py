@@ -0,0 +1,165 @@
+"""
+Caches that let the weather servers answer most calls without upstream
+requests.
+
+City coordinates never change, so geocoding results are kept in a small
+SQLite database on local disk and survive restarts. "Not found" results
+are kept too, but only for a day, in case the city shows up upstream.
+Current weather is only refreshed upstream about every 15 minutes, so it
+is kept in memory for a TTL, keyed by coordinates rounded to ~1 km. Both
+caches are bounded and count their hits and misses.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+def _hit_rate(hits: int, misses: int) -> str:
+    lookups = hits + misses
+    return f"{hits / lookups:.0%}" if lookups else "n/a"
+
+
+def normalize_city(city_name: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", city_name).casefold()
+                    .split())
+
+
+class GeocodingCache:
+    """
+    Persistent geocoding results keyed by normalized city name and language.
+    Lookups are primary key reads on a local file, cheap enough to run on
+    the event loop; hits only note their use time in memory, and those are
+    written with the next `put` or `close`. Once more than `max_entries`
+    are stored the least recently used ones are deleted. Cities not found
+    expire after `negative_ttl` seconds.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10_000,
+                 negative_ttl: float = 86_400):
+        self.path = path
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._used: Dict[tuple, float] = {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS geocodes (
+                city TEXT NOT NULL,
+                language TEXT NOT NULL,
+                location TEXT,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (city, language)
+            )
+        ''')
+        self._conn.commit()
+
+    def get(self, city_name: str,
+            language: str) -> Tuple[bool, Optional[dict]]:
+        """
+        Returns (True, location) on a hit, location being None for cities
+        known not to exist, and (False, None) on a miss.
+        """
+        key = (normalize_city(city_name), language)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT location, last_used FROM geocodes WHERE city = ? "
+                "AND language = ?", key).fetchone()
+            # last_used of "not found" entries stays their put time
+            if row is None or (row[0] is None and
+                               row[1] + self.negative_ttl < time.time()):
+                self.misses += 1
+                return False, None
+            if row[0] is not None:
+                self._used[key] = time.time()
+        self.hits += 1
+        return True, json.loads(row[0]) if row[0] else None
+
+    def _flush_used(self):
+        """Write the use times noted by `get`, under the lock."""
+        if self._used:
+            self._conn.executemany(
+                "UPDATE geocodes SET last_used = ? WHERE city = ? AND "
+                "language = ?",
+                [(used, *key) for key, used in self._used.items()])
+            self._used.clear()
+
+    def put(self, city_name: str, language: str, location: Optional[dict]):
+        with self._lock:
+            self._flush_used()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?)",
+                (normalize_city(city_name), language,
+                 json.dumps(location) if location else None, time.time()))
+            self._conn.execute(
+                "DELETE FROM geocodes WHERE rowid IN (SELECT rowid FROM "
+                "geocodes ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT count(*) FROM geocodes").fetchone()[0]
+
+    def stats(self) -> str:
+        return (f"Geocoding cache: {len(self)} of {self.max_entries} "
+                f"cities, {self.hits} hits, {self.misses} misses "
+                f"({_hit_rate(self.hits, self.misses)} hit rate)")
+
+    def close(self):
+        with self._lock:
+            self._flush_used()
+            self._conn.commit()
+            self._conn.close()
+
+
+class ForecastCache:
+    """
+    In-memory current weather keyed by coordinates rounded to two decimals,
+    valid for `ttl` seconds and bounded to `max_entries` (LRU).
+    """
+
+    def __init__(self, ttl: float = 900, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, Tuple[float, dict]] = OrderedDict()
+
+    @staticmethod
+    def key(latitude: float, longitude: float) -> tuple:
+        return (round(latitude, 2), round(longitude, 2))
+
+    def get(self, latitude: float, longitude: float) -> Optional[dict]:
+        key = self.key(latitude, longitude)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, latitude: float, longitude: float, current: dict):
+        key = self.key(latitude, longitude)
+        self._entries[key] = (time.monotonic() + self.ttl, current)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> str:
+        return (f"Forecast cache: {len(self._entries)} of "
+                f"{self.max_entries} locations, ttl {self.ttl:g}s, "
+                f"{self.hits} hits, {self.misses} misses "
+                f"({_hit_rate(self.hits, self.misses)} hit rate)")
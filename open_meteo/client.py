@@ -0,0 +1,312 @@
+"""
+Async client for the Open-Meteo geocoding and forecast APIs.
+
+Every API host gets its own long-lived httpx.AsyncClient, so TCP/TLS
+connections are kept alive and reused between tool calls and the number of
+connections to each host is bounded. The base URLs can be overridden with
+OPEN_METEO_GEOCODING_URL and OPEN_METEO_FORECAST_URL, e.g. to point the
+servers at a local stub.
+
+Geocoding results and current weather are served from caches when
+possible (see cache.py), and concurrent lookups of the same city or
+location share a single upstream request.
+"""
+
+import asyncio
+import os
+from typing import (Awaitable, Callable, Dict, List, Optional, Sequence,
+                    Tuple, Union)
+import httpx
+from .cache import ForecastCache, GeocodingCache, normalize_city
+
+
+GEOCODING_URL = "https://geocoding-api.open-meteo.com/v1"
+FORECAST_URL = "https://api.open-meteo.com/v1"
+MAX_LOCATIONS_PER_REQUEST = 100
+
+
+def format_current_weather(location: dict, current: dict) -> str:
+    return (
+        f"Weather in {location['name']} ({location['latitude']}, "
+        f"{location['longitude']}):\n"
+        f"- Temperature: {current['temperature']}°C\n"
+        f"- Wind speed: {current['windspeed']} km/h\n"
+        f"- Weather code: {current['weathercode']}"
+    )
+
+
+def _table_row(cells: Sequence) -> str:
+    return "| " + " | ".join(
+        str(cell).replace("|", "\\|").replace("\n", " ")
+        for cell in cells) + " |"
+
+
+def _error(e: Exception) -> str:
+    return (str(e).splitlines() or [type(e).__name__])[0]
+
+
+class OpenMeteoClient:
+    """
+    Pooled async access to Open-Meteo.
+
+    Args:
+        geocoding_url: Base URL of the geocoding API.
+        forecast_url: Base URL of the forecast API.
+        timeout: Seconds to wait for a response (connecting is capped at 5).
+        max_connections: Maximum open connections per API host.
+        max_keepalive: Idle connections kept alive per API host.
+        geocoding_cache: Cache of geocoding results, None to disable.
+        forecast_cache: Cache of current weather, None to disable.
+    """
+
+    def __init__(self, geocoding_url: Optional[str] = None,
+                 forecast_url: Optional[str] = None, timeout: float = 10.0,
+                 max_connections: int = 10, max_keepalive: int = 5,
+                 geocoding_cache: Optional[GeocodingCache] = None,
+                 forecast_cache: Optional[ForecastCache] = None):
+        self.geocoding_url = geocoding_url or os.environ.get(
+            "OPEN_METEO_GEOCODING_URL", GEOCODING_URL)
+        self.forecast_url = forecast_url or os.environ.get(
+            "OPEN_METEO_FORECAST_URL", FORECAST_URL)
+        self.timeout = httpx.Timeout(timeout, connect=min(timeout, 5.0))
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive)
+        self.geocoding_cache = geocoding_cache
+        self.forecast_cache = forecast_cache
+        self.upstream_requests = 0
+        self._geocoding: Optional[httpx.AsyncClient] = None
+        self._forecast: Optional[httpx.AsyncClient] = None
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+    def _http(self, base_url: str) -> httpx.AsyncClient:
+        return httpx.AsyncClient(base_url=base_url, timeout=self.timeout,
+                                 limits=self.limits)
+
+    async def _get(self, api: str, path: str, params: dict) -> dict:
+        if api == "geocoding":
+            if self._geocoding is None:
+                self._geocoding = self._http(self.geocoding_url)
+            http = self._geocoding
+        else:
+            if self._forecast is None:
+                self._forecast = self._http(self.forecast_url)
+            http = self._forecast
+        self.upstream_requests += 1
+        response = await http.get(path, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def _shared(self, key: tuple, fetch: Callable[[], Awaitable]):
+        """Await `fetch()`, sharing one call between concurrent callers."""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fetch())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def geocode(self, city_name: str,
+                      language: str = "en") -> Optional[dict]:
+        """First geocoding match of `city_name`, None if there is none."""
+        if self.geocoding_cache is not None:
+            hit, location = self.geocoding_cache.get(city_name, language)
+            if hit:
+                return location
+        return await self._shared(
+            ("geocode", normalize_city(city_name), language),
+            lambda: self._fetch_geocode(city_name, language))
+
+    async def _fetch_geocode(self, city_name: str,
+                             language: str) -> Optional[dict]:
+        data = await self._get("geocoding", "/search", {
+            "name": city_name,
+            "count": 1,
+            "language": language,
+            "format": "json",
+        })
+        results = data.get("results") or []
+        location = results[0] if results else None
+        if self.geocoding_cache is not None:
+            self.geocoding_cache.put(city_name, language, location)
+        return location
+
+    async def current_weather(self, latitude: float,
+                              longitude: float) -> Optional[dict]:
+        """Current weather at the coordinates, None if not available."""
+        if self.forecast_cache is not None:
+            current = self.forecast_cache.get(latitude, longitude)
+            if current is not None:
+                return current
+        return await self._shared(
+            ("forecast", ForecastCache.key(latitude, longitude)),
+            lambda: self._fetch_current_weather(latitude, longitude))
+
+    async def _fetch_current_weather(self, latitude: float,
+                                     longitude: float) -> Optional[dict]:
+        data = await self._get("forecast", "/forecast", {
+            "latitude": latitude,
+            "longitude": longitude,
+            "current_weather": "true",
+        })
+        current = data.get("current_weather")
+        if current is not None and self.forecast_cache is not None:
+            self.forecast_cache.put(latitude, longitude, current)
+        return current
+
+    async def current_weather_many(
+            self, coordinates: Sequence[Tuple[float, float]]
+            ) -> List[Union[dict, None, Exception]]:
+        """
+        Current weather at several coordinates. Locations missing from the
+        cache are fetched together in one multi-location request (split in
+        chunks of MAX_LOCATIONS_PER_REQUEST). When a chunk fails, its
+        locations get the exception instead of a result; the other chunks
+        are unaffected.
+        """
+        results: List[Union[dict, None, Exception]] = \
+            [None] * len(coordinates)
+        missing = []
+        for i, (latitude, longitude) in enumerate(coordinates):
+            if self.forecast_cache is not None:
+                results[i] = self.forecast_cache.get(latitude, longitude)
+            if results[i] is None:
+                missing.append(i)
+
+        for start in range(0, len(missing), MAX_LOCATIONS_PER_REQUEST):
+            chunk = missing[start:start + MAX_LOCATIONS_PER_REQUEST]
+            try:
+                data = await self._get("forecast", "/forecast", {
+                    "latitude": ",".join(str(coordinates[i][0])
+                                         for i in chunk),
+                    "longitude": ",".join(str(coordinates[i][1])
+                                          for i in chunk),
+                    "current_weather": "true",
+                })
+            except (httpx.HTTPError, ValueError) as e:
+                for i in chunk:
+                    results[i] = e
+                continue
+            # A single location is answered with an object, several with a
+            # list in request order
+            locations = data if isinstance(data, list) else [data]
+            for i, location in zip(chunk, locations):
+                results[i] = location.get("current_weather")
+                if results[i] is not None and self.forecast_cache is not None:
+                    self.forecast_cache.put(*coordinates[i], results[i])
+        return results
+
+    async def forecast_many(self, city_names: Sequence[str],
+                            max_concurrency: int = 8) -> str:
+        """
+        Current weather of several cities as one markdown table. Cities are
+        geocoded concurrently, at most `max_concurrency` at a time, and all
+        found locations share one forecast request. Cities that cannot be
+        resolved or fetched are reported in the table instead of failing
+        the whole batch.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def locate(city_name: str):
+            async with semaphore:
+                try:
+                    return await self.geocode(city_name)
+                except (httpx.HTTPError, ValueError) as e:
+                    return e
+
+        city_names = list(dict.fromkeys(city_names))
+        locations = await asyncio.gather(*(locate(c) for c in city_names))
+        found = [i for i, location in enumerate(locations)
+                 if isinstance(location, dict)]
+
+        currents = await self.current_weather_many(
+            [(locations[i]["latitude"], locations[i]["longitude"])
+             for i in found])
+        weather = dict(zip(found, currents))
+
+        lines = [
+            _table_row(["city", "location", "latitude", "longitude",
+                        "temperature (°C)", "wind speed (km/h)",
+                        "weather code", "error"]),
+            "|" + "---|" * 8,
+        ]
+        for i, city_name in enumerate(city_names):
+            location = locations[i]
+            current = weather.get(i)
+            if location is None:
+                lines.append(_table_row([city_name] + [""] * 6 +
+                                        ["city not found"]))
+            elif isinstance(location, Exception):
+                lines.append(_table_row([city_name] + [""] * 6 +
+                                        ["geocoding failed: "
+                                         + _error(location)]))
+            elif not isinstance(current, dict):
+                error = "forecast failed: " + _error(current) if current \
+                    else "no current weather data"
+                lines.append(_table_row(
+                    [city_name, location["name"], location["latitude"],
+                     location["longitude"], "", "", "", error]))
+            else:
+                lines.append(_table_row(
+                    [city_name, location["name"], location["latitude"],
+                     location["longitude"], current["temperature"],
+                     current["windspeed"], current["weathercode"], ""]))
+        return "\n".join(lines)
+
+    async def forecast(self, city_name: str) -> str:
+        """Human-readable current weather of `city_name`."""
+        try:
+            location = await self.geocode(city_name)
+            if location is None:
+                return f"City '{city_name}' not found."
+            current = await self.current_weather(location["latitude"],
+                                                  location["longitude"])
+        except (httpx.HTTPError, ValueError) as e:
+            return f"Error fetching weather data: {str(e)}"
+        if current is None:
+            return "Could not fetch current weather data."
+        return format_current_weather(location, current)
+
+    def stats(self) -> str:
+        lines = [f"Upstream requests: {self.upstream_requests}"]
+        for cache in (self.geocoding_cache, self.forecast_cache):
+            if cache is not None:
+                lines.append(cache.stats())
+        return "\n".join(lines)
+
+    async def aclose(self):
+        for http in (self._geocoding, self._forecast):
+            if http is not None:
+                await http.aclose()
+        self._geocoding = self._forecast = None
+
+
+_client: Optional[OpenMeteoClient] = None
+
+
+def get_client() -> OpenMeteoClient:
+    """
+    The process-wide client shared by all tools of a server, with its
+    caches configured from the environment: OPEN_METEO_CACHE_DIR (where the
+    geocoding database lives), OPEN_METEO_GEOCODING_MAX_ENTRIES,
+    OPEN_METEO_GEOCODING_NEGATIVE_TTL (seconds "not found" cities are
+    remembered), OPEN_METEO_FORECAST_TTL and
+    OPEN_METEO_FORECAST_MAX_ENTRIES.
+    """
+    global _client
+    if _client is None:
+        cache_dir = os.environ.get(
+            "OPEN_METEO_CACHE_DIR",
+            os.path.join(os.path.expanduser("~"), ".cache", "open_meteo"))
+        _client = OpenMeteoClient(
+            geocoding_cache=GeocodingCache(
+                os.path.join(cache_dir, "geocoding.sqlite3"),
+                int(os.environ.get("OPEN_METEO_GEOCODING_MAX_ENTRIES",
+                                   10_000)),
+                float(os.environ.get("OPEN_METEO_GEOCODING_NEGATIVE_TTL",
+                                     86_400))),
+            forecast_cache=ForecastCache(
+                float(os.environ.get("OPEN_METEO_FORECAST_TTL", 900)),
+                int(os.environ.get("OPEN_METEO_FORECAST_MAX_ENTRIES",
+                                   1024))),
+        )
+    return _client